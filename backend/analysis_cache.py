@@ -0,0 +1,88 @@
+"""
+Persistent LRU cache of analysis results, keyed by image content hash
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+
+CACHE_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'analysis_cache.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries(used);
+"""
+
+
+def image_hash(image_path):
+    """SHA-256 of the image bytes."""
+    h = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Size-bounded LRU in SQLite (WAL), so the server and backfill can share it: each put is
+    one row, and least recently used rows are evicted. Keys are '<prompt_version>:<image_hash>'.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    def get(self, key):
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, value, used) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), time.time()))
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("DELETE FROM entries WHERE key IN "
+                             "(SELECT key FROM entries ORDER BY used LIMIT ?)", (excess,))
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
@@ -1,13 +1,22 @@
 """
-Analyze screenshot using Kiro CLI vision
+Analyze screenshot using Kiro CLI vision, optionally with a local detector for counting
 """
 import subprocess
 import sys
 import re
 import os
 import json
+import time
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 
-from config import PARTY_THRESHOLDS
+from config import (PARTY_THRESHOLDS, ANALYSIS_MODE, ANALYSIS_CONCURRENCY, KIRO_TIMEOUT, ANALYSIS_CACHE_SIZE,
+                    ROIS, ROI_MAX_WIDTH, ROI_SPLIT_PEOPLE, ANALYZER_BACKEND, LOCAL_MIN_CONFIDENCE,
+                    LOCAL_MODEL_PATH, LOCAL_MIN_SCORE)
+from analysis_cache import AnalysisCache, image_hash
 
 def get_party_level(people_count):
     """Convert people count to party level 0-10"""
@@ -16,12 +25,18 @@ def get_party_level(people_count):
             return level
     return 10
 
-def _run_kiro(prompt):
-    """Run kiro-cli and return parsed JSON or None."""
+def _run_kiro(prompt, deadline=None):
+    """Run kiro-cli and return parsed JSON or None. Killed after KIRO_TIMEOUT, or at the deadline if sooner."""
+    timeout = KIRO_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            print("[ERROR] kiro-cli: analysis deadline passed, skipped", flush=True)
+            return None
     try:
         result = subprocess.run(
             ['/home/ubuntu/.local/bin/kiro-cli', 'chat', '--trust-all-tools', prompt],
-            capture_output=True, text=True, timeout=120, input=''
+            capture_output=True, text=True, timeout=timeout, input=''
         )
         response = re.sub(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])', '', result.stdout).strip()
         match = re.search(r'\{[^}]+\}', response)
@@ -31,38 +46,14 @@ def _run_kiro(prompt):
         print(f"[ERROR] kiro-cli: {e}", flush=True)
     return None
 
-def analyze_image(image_path):
-    """Use kiro-cli to analyze screenshot - two calls: people/cars + police."""
-    print(f"[DEBUG] Starting analysis of: {image_path}", flush=True)
-    
-    if not os.path.exists(image_path):
-        print(f"[ERROR] Image not found: {image_path}", flush=True)
-        return {"people": 0, "street": 0, "terrace": 0, "cars": 0, "police_cars": 0, "police_vans": 0, "police_uniformed": 0}
-    
-    # Call 1: People and cars
-    people_prompt = f"""Look at this image: {image_path}
-
-Count people and vehicles in this plaza image.
-
-PEOPLE - Count in TWO categories:
+PEOPLE_INSTRUCTIONS = """PEOPLE - Count in TWO categories:
 - "street": People walking/standing in the plaza (not at restaurants)
 - "terrace": People sitting at restaurant terraces/outdoor seating
 Be CONSERVATIVE - if unsure, don't count.
 
-CARS - Count all vehicles (cars, vans, trucks).
-
-Return ONLY JSON: {{"street": N, "terrace": N, "cars": N}}"""
-
-    print(f"[DEBUG] Call 1: people/cars...", flush=True)
-    people_data = _run_kiro(people_prompt) or {}
-    print(f"[DEBUG] People result: {people_data}", flush=True)
-    
-    # Call 2: Police detection
-    police_prompt = f"""Look at this image: {image_path}
+CARS - Count all vehicles (cars, vans, trucks)."""
 
-POLICE DETECTION ONLY - Ignore people and regular cars.
-
-### Policía Local (Reus) - MOST COMMON
+POLICE_INSTRUCTIONS = """### Policía Local (Reus) - MOST COMMON
 Small car (NOT a van) with THREE-TONE paint:
 - Bottom/lower body: BRIGHT YELLOW
 - Middle/upper doors: DARK BLUE  
@@ -75,13 +66,215 @@ Small car (NOT a van) with THREE-TONE paint:
 - Any vehicle with BLUE FLASHING LIGHTS
 
 ### NOT Police
-- DHL/Correos: Large yellow VANS (solid yellow, no blue)
+- DHL/Correos: Large yellow VANS (solid yellow, no blue)"""
+
+def _people_prompt(image_path):
+    return f"""Look at this image: {image_path}
+
+Count people and vehicles in this plaza image.
+
+{PEOPLE_INSTRUCTIONS}
+
+Return ONLY JSON: {{"street": N, "terrace": N, "cars": N}}"""
+
+def _police_prompt(image_path):
+    return f"""Look at this image: {image_path}
+
+POLICE DETECTION ONLY - Ignore people and regular cars.
+
+{POLICE_INSTRUCTIONS}
 
 Return ONLY JSON: {{"police_cars": N, "police_vans": N, "police_uniformed": N}}"""
 
-    print(f"[DEBUG] Call 2: police...", flush=True)
-    police_data = _run_kiro(police_prompt) or {}
+def _fused_prompt(image_path):
+    return f"""Look at this image: {image_path}
+
+Count people and vehicles in this plaza image, and detect police.
+
+{PEOPLE_INSTRUCTIONS}
+
+POLICE - Count police cars, police vans and uniformed officers.
+{POLICE_INSTRUCTIONS}
+
+Return ONLY JSON: {{"street": N, "terrace": N, "cars": N, "police_cars": N, "police_vans": N, "police_uniformed": N}}"""
+
+REGION_PEOPLE = {
+    "street": "walking or standing in the plaza (NOT seated at restaurant tables)",
+    "terrace": "sitting at restaurant terraces/outdoor seating",
+}
+
+def _region_people_prompt(image_path, region):
+    return f"""Look at this image: {image_path}
+
+This is a cropped part of a plaza. Count people {REGION_PEOPLE[region]}.
+Be CONSERVATIVE - if unsure, don't count.
+
+Return ONLY JSON: {{"people": N}}"""
+
+def _road_prompt(image_path):
+    return f"""Look at this image: {image_path}
+
+This is the roadway of a plaza. Count all vehicles (cars, vans, trucks), then detect police.
+
+{POLICE_INSTRUCTIONS}
+
+Return ONLY JSON: {{"cars": N, "police_cars": N, "police_vans": N, "police_uniformed": N}}"""
+
+def _detector_version():
+    """Local model (file contents) and thresholds, for backends that use the detector."""
+    if ANALYZER_BACKEND not in ('local', 'hybrid'):
+        return ''
+    from detector import SURE_SCORE
+    try:
+        model = image_hash(LOCAL_MODEL_PATH)  # Any file's SHA-256
+    except OSError:
+        model = 'missing'  # Falls back to kiro-cli, see _detect_local
+    return json.dumps([model, LOCAL_MIN_SCORE, LOCAL_MIN_CONFIDENCE, SURE_SCORE])
+
+# Changes whenever prompt text, mode, regions or the local model/thresholds change, so old cache entries stop matching
+PROMPT_VERSION = hashlib.sha256(
+    (ANALYZER_BACKEND + ANALYSIS_MODE + _people_prompt('') + _police_prompt('') + _fused_prompt('')
+     + _region_people_prompt('', 'street') + _region_people_prompt('', 'terrace') + _road_prompt('')
+     + json.dumps([ROIS, ROI_MAX_WIDTH, ROI_SPLIT_PEOPLE], sort_keys=True) + _detector_version()).encode()
+).hexdigest()[:12]
+
+def _union(*rois):
+    """Bounding box of several regions. None (full frame) absorbs everything."""
+    if any(r is None for r in rois):
+        return None
+    return (min(r[0] for r in rois), min(r[1] for r in rois), max(r[2] for r in rois), max(r[3] for r in rois))
+
+def _crop(image_path, roi, out_dir, name):
+    """Crop a region (fractions of the frame) and downscale to ROI_MAX_WIDTH. Returns the image path."""
+    with Image.open(image_path) as img:
+        if roi is None and not (ROI_MAX_WIDTH and img.width > ROI_MAX_WIDTH):
+            return image_path
+        w, h = img.size
+        region = img if roi is None else img.crop(
+            (round(roi[0] * w), round(roi[1] * h), round(roi[2] * w), round(roi[3] * h)))
+        if ROI_MAX_WIDTH and region.width > ROI_MAX_WIDTH:
+            region = region.resize((ROI_MAX_WIDTH, round(region.height * ROI_MAX_WIDTH / region.width)), Image.LANCZOS)
+        path = os.path.join(out_dir, f'{name}.png')
+        region.save(path)
+    return path
+
+def _build_prompts(image_path, out_dir):
+    """Prompts for ANALYSIS_MODE, each pointed at the crop of its region."""
+    crop = lambda name, roi: _crop(image_path, roi, out_dir, name)
+    if ANALYSIS_MODE == 'fused':
+        return {"all": _fused_prompt(crop('all', _union(*ROIS.values())))}
+    if ROI_SPLIT_PEOPLE:
+        return {
+            "street": _region_people_prompt(crop('street', ROIS.get('street')), 'street'),
+            "terrace": _region_people_prompt(crop('terrace', ROIS.get('terrace')), 'terrace'),
+            "road": _road_prompt(crop('road', ROIS.get('road'))),
+        }
+    return {
+        "people": _people_prompt(crop('people', _union(ROIS.get('street'), ROIS.get('terrace')))),
+        "police": _police_prompt(crop('police', ROIS.get('road'))),
+    }
+
+def _combine(results):
+    """Merge per-prompt JSON into (people_data, police_data)."""
+    if "all" in results:
+        return results["all"], results["all"]
+    if "road" in results:
+        people_data = {
+            "street": results["street"].get("people", 0),
+            "terrace": results["terrace"].get("people", 0),
+            "cars": results["road"].get("cars", 0),
+        }
+        return people_data, results["road"]
+    return results["people"], results["police"]
+
+cache = AnalysisCache(max_entries=ANALYSIS_CACHE_SIZE)
+
+_detector = None
+_detector_failed = False
+# One model shared by every analysis thread (backfill workers, ANALYZER_WORKERS); OpenCV's
+# setInput()/forward() pair is not thread-safe, so loading and each detect() run one at a time
+_detector_lock = threading.Lock()
+
+def _detect_local(image_path):
+    """Local detector counts, or None if the backend is kiro or the detector can't run."""
+    global _detector, _detector_failed
+    if ANALYZER_BACKEND not in ('local', 'hybrid') or _detector_failed:
+        return None
+    try:
+        with _detector_lock:
+            if _detector_failed:
+                return None
+            if _detector is None:
+                from detector import LocalDetector
+                _detector = LocalDetector()
+            result = _detector.detect(image_path)
+        print(f"[DEBUG] Local detector: {result}", flush=True)
+        return result
+    except Exception as e:
+        # Missing opencv/model: stop retrying and use kiro-cli for everything
+        if _detector is None:
+            _detector_failed = True
+        print(f"[ERROR] local detector, falling back to kiro-cli: {e}", flush=True)
+        return None
+
+def _run_prompts(prompts, deadline=None):
+    """
+    Run named prompts according to ANALYSIS_MODE, all finished by `deadline` (time.monotonic()).
+    prompts: {name: prompt}. Returns {name: parsed JSON or {}}
+    """
+    if ANALYSIS_MODE == 'parallel' and len(prompts) > 1:
+        with ThreadPoolExecutor(max_workers=ANALYSIS_CONCURRENCY) as pool:
+            futures = {name: pool.submit(_run_kiro, prompt, deadline) for name, prompt in prompts.items()}
+            return {name: f.result() or {} for name, f in futures.items()}
+    return {name: _run_kiro(prompt, deadline) or {} for name, prompt in prompts.items()}
+
+def analyze_image(image_path, use_cache=True, deadline=None, with_status=False):
+    """
+    Analyze screenshot - people/cars + police, per ANALYZER_BACKEND and ANALYSIS_MODE.
+    kiro-cli calls still running at `deadline` (time.monotonic()) are killed, their counts are zero.
+    with_status: return (analysis, complete) instead, complete False when any call failed
+    or the image is missing, so callers can tell those zeros from real counts.
+    """
+    result = lambda analysis, complete: (analysis, complete) if with_status else analysis
+    print(f"[DEBUG] Starting analysis of: {image_path} (backend: {ANALYZER_BACKEND}, mode: {ANALYSIS_MODE})", flush=True)
+    
+    if not os.path.exists(image_path):
+        print(f"[ERROR] Image not found: {image_path}", flush=True)
+        return result({"people": 0, "street": 0, "terrace": 0, "cars": 0, "police_cars": 0, "police_vans": 0,
+                       "police_uniformed": 0}, False)
+    
+    key = f"{PROMPT_VERSION}:{image_hash(image_path)}"
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"[DEBUG] Cache hit: {cached} {cache.stats()}", flush=True)
+            return result(cached, True)
+    
+    analysis, complete = _analyze(image_path, deadline)
+    # Don't cache failed kiro-cli calls, their zeros are not a real result
+    if complete:
+        cache.put(key, analysis)
+    return result(analysis, complete)
+
+def _analyze(image_path, deadline=None):
+    """Run the configured backend. Returns: analysis dict, whether every call produced a result"""
+    started = time.monotonic()
+    local = _detect_local(image_path)
+    with tempfile.TemporaryDirectory(prefix='reusparty_roi_') as out_dir:
+        if local is not None and ANALYZER_BACKEND == 'local':
+            results = {"local": local}
+            people_data, police_data = local, {}
+        elif local is not None and local["confidence"] >= LOCAL_MIN_CONFIDENCE:
+            # Hybrid: trust local counts, escalate only police classification to kiro-cli
+            results = _run_prompts({"police": _police_prompt(_crop(image_path, ROIS.get('road'), out_dir, 'police'))},
+                                   deadline)
+            people_data, police_data = local, results["police"]
+        else:
+            results = _run_prompts(_build_prompts(image_path, out_dir), deadline)
+            people_data, police_data = _combine(results)
+    print(f"[DEBUG] People result: {people_data}", flush=True)
     print(f"[DEBUG] Police result: {police_data}", flush=True)
+    print(f"[DEBUG] Analysis took {time.monotonic() - started:.1f}s", flush=True)
     
     street = people_data.get("street", 0)
     terrace = people_data.get("terrace", 0)
@@ -94,16 +287,18 @@ Return ONLY JSON: {{"police_cars": N, "police_vans": N, "police_uniformed": N}}"
         "police_cars": police_data.get("police_cars", 0),
         "police_vans": police_data.get("police_vans", 0),
         "police_uniformed": police_data.get("police_uniformed", 0)
-    }
+    }, all(results.values())
 
 def calc_police_score(police_cars, police_vans, police_uniformed):
     """Calculate police score: cars×2 + vans×4 + uniformed×1"""
     return police_cars * 2 + police_vans * 4 + police_uniformed * 1
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        result = analyze_image(sys.argv[1])
+    args = [a for a in sys.argv[1:] if a != '--no-cache']
+    if args:
+        result = analyze_image(args[0], use_cache='--no-cache' not in sys.argv)
         score = calc_police_score(result["police_cars"], result["police_vans"], result["police_uniformed"])
         print(f"Result: {result}, Police Score: {score}")
+        print(f"Cache: {cache.stats()}")
     else:
-        print("Usage: python analyzer.py <image_path>")
+        print("Usage: python analyzer.py <image_path> [--no-cache]")
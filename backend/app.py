@@ -1,34 +1,66 @@
 import json
+import io
 import os
-import glob
+import atexit
+import gzip
+import threading
 from datetime import datetime
-from flask import Flask, jsonify, send_from_directory, send_file, request
+from flask import Flask, Response, jsonify, send_from_directory, send_file, request, stream_with_context
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from config import SCREENSHOT_INTERVAL, YOUTUBE_URL, PORT
-from screenshot import capture_youtube_frame
-from analyzer import get_party_level, analyze_image, calc_police_score
+from config import (SCREENSHOT_INTERVAL, YOUTUBE_URL, PORT, CAPTURE_RELAUNCH_AFTER, CHANGE_THRESHOLD, CHANGE_MAX_SKIPS,
+                    ANALYZER_BACKEND, ANALYZER_WORKERS, ANALYSIS_JOB_TIMEOUT,
+                    PIPELINE_POLICY, PIPELINE_QUEUE_SIZE, PIPELINE_EVERY_NTH, HISTORY_MAX_POINTS,
+                    DASHBOARD_TTL, COMPRESS_MIN_BYTES, REFRESH_MIN_INTERVAL, REFRESH_JOB_TIMEOUT)
+from screenshot import CaptureSession, frame_time
+from catalog import ScreenshotCatalog
+from variants import SIZES as VARIANT_SIZES, make_variants, get_variant
+from archive import read_archived
+from retention import run_retention
+from analyzer import get_party_level, analyze_image, calc_police_score, cache as analysis_cache
+from frame_diff import frame_signature, frame_difference
+from worker import AnalyzerWorker, stub_analyze
+from pipeline import Pipeline, Stage
 from restaurants import fetch_restaurants
-from database import save_party_data, save_restaurant_data, get_party_history, get_restaurant_history, get_restaurant_history_by_name, get_police_sightings
+from rollups import init_rollups, rollup_recent
+import sightings
+from events import broker, bus
+from leader import LeaderLock
+from refresh import JOBS_FILE as REFRESH_JOBS_FILE, RefreshJobs
+from memo import Memo
+from state import PartyState
+from database import query_cache, save_party_data, save_restaurant_data, get_party_history, get_restaurant_history, get_restaurant_history_by_name, get_police_sightings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Optional: gzip only
 
 app = Flask(__name__, static_folder='../frontend')
 DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'party_data.json')
+SCHEDULER_LOCK_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'scheduler.lock')
 SCREENSHOTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'screenshots')
 
+# Warm browser kept open across captures, owned by the scheduler
+capture_session = CaptureSession(YOUTUBE_URL, relaunch_after=CAPTURE_RELAUNCH_AFTER)
 
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE) as f:
-            return json.load(f)
-    return {"people_count": 0, "party_level": 0, "car_count": 0, "police_count": 0, 
-            "police_score": 0, "police_cars": 0, "police_vans": 0, "police_uniformed": 0, 
-            "last_updated": None, "error": None}
+# Analysis jobs run on a long-lived worker; 'stub' backend skips the models entirely
+analyzer_worker = AnalyzerWorker(stub_analyze if ANALYZER_BACKEND == 'stub' else analyze_image,
+                                 workers=ANALYZER_WORKERS, timeout=ANALYSIS_JOB_TIMEOUT)
 
+# Sorted frame names, built at startup and kept current by the capture stage
+screenshot_catalog = ScreenshotCatalog(SCREENSHOTS_DIR)
 
-def save_data(data):
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f)
+# Forced refreshes ride on the next captured frame, see /api/refresh
+refresh_jobs = RefreshJobs(REFRESH_JOBS_FILE, min_interval=REFRESH_MIN_INTERVAL, timeout=REFRESH_JOB_TIMEOUT)
+
+# Current snapshot served by /api/party, rehydrated from DATA_FILE in create_app()
+party_state = PartyState(DATA_FILE)
+atexit.register(party_state.flush)
+
+# Last frame that went through AI analysis, for change detection
+last_analyzed = {"signature": None, "analysis": None, "skips": 0}
+analysis_lock = threading.Lock()
 
 
 def get_restaurant_busyness_avg():
@@ -52,63 +84,282 @@ def get_combined_party_level(people_count):
     return round((people_level + rest_level) / 2)
 
 
-def update_party_data():
-    """Capture screenshot and analyze with AI."""
-    data = load_data()
-    try:
-        image_path = capture_youtube_frame(YOUTUBE_URL)
-        analysis = analyze_image(image_path)
-        
-        people_count = analysis["people"]
-        street_count = analysis.get("street", 0)
-        terrace_count = analysis.get("terrace", 0)
-        car_count = analysis["cars"]
-        police_cars = analysis["police_cars"]
-        police_vans = analysis["police_vans"]
-        police_uniformed = analysis["police_uniformed"]
-        police_score = calc_police_score(police_cars, police_vans, police_uniformed)
-        
-        data.update({
-            "last_screenshot": image_path,
-            "people_count": people_count,
-            "street_count": street_count,
-            "terrace_count": terrace_count,
-            "car_count": car_count,
-            "police_count": police_cars + police_vans + police_uniformed,
-            "police_score": police_score,
-            "police_cars": police_cars,
-            "police_vans": police_vans,
-            "police_uniformed": police_uniformed,
-            "party_level": get_combined_party_level(people_count),
-            "last_updated": datetime.now().isoformat(),
-            "error": None
-        })
-        
-        save_party_data(people_count, data["party_level"], car_count, police_score,
-                       police_cars, police_vans, police_uniformed, street_count, terrace_count)
-        print(f"Screenshot: {image_path}, People: {people_count} (street: {street_count}, terrace: {terrace_count}), "
-              f"Cars: {car_count}, Police: {data['police_count']} (score: {police_score}), Level: {data['party_level']}")
-    except Exception as e:
-        data["error"] = str(e)
-        data["last_updated"] = datetime.now().isoformat()
-        print(f"Error: {e}")
-    save_data(data)
+def _restore_last_analyzed(data):
+    """Rebuild change-detection state from party_data.json after a restart."""
+    path = data.get("last_analyzed_screenshot")
+    if not path or not os.path.exists(path):
+        return
+    last_analyzed.update({
+        "signature": frame_signature(path),
+        "analysis": {
+            "people": data.get("people_count", 0),
+            "street": data.get("street_count", 0),
+            "terrace": data.get("terrace_count", 0),
+            "cars": data.get("car_count", 0),
+            "police_cars": data.get("police_cars", 0),
+            "police_vans": data.get("police_vans", 0),
+            "police_uniformed": data.get("police_uniformed", 0),
+        },
+        "skips": data.get("carried_forward_count", 0),
+    })
+
+
+def analyze_if_changed(image_path):
+    """
+    Run AI analysis only when the frame differs enough from the last analyzed one.
+    Returns: analysis, change_score (None if not compared), carried_forward
+    """
+    with analysis_lock:
+        if last_analyzed["signature"] is None:
+            _restore_last_analyzed(party_state.get())
+        signature = frame_signature(image_path)
+        score = None
+        if last_analyzed["signature"] is not None and last_analyzed["analysis"] is not None:
+            score = frame_difference(last_analyzed["signature"], signature)
+            if score < CHANGE_THRESHOLD and last_analyzed["skips"] < CHANGE_MAX_SKIPS:
+                last_analyzed["skips"] += 1
+                return last_analyzed["analysis"], score, True
+        analysis = analyzer_worker.analyze(image_path)
+        last_analyzed.update({"signature": signature, "analysis": analysis, "skips": 0})
+        return analysis, score, False
+
+
+def capture_frame(frame):
+    """Pipeline stage 1: grab a frame from the warm browser (answering a pending refresh, if any)."""
+    frame["refresh_job"] = refresh_jobs.claim()
+    image_path, capture_timings = capture_session.capture()
+    print(f"Capture timings (ms): {capture_timings}")
+    make_variants(image_path)
+    screenshot_catalog.add(image_path)
+    frame.update({
+        "image_path": image_path,
+        "captured_at": datetime.now().isoformat(),
+        "capture_timings": capture_timings,
+    })
+    return frame
+
+
+def analyze_frame(frame):
+    """Pipeline stage 2: count people, cars and police (or carry forward)."""
+    if frame["refresh_job"]:
+        refresh_jobs.update(frame["refresh_job"], stage='analysis')
+    analysis, change_score, carried_forward = analyze_if_changed(frame["image_path"])
+    frame.update({
+        "analysis": analysis,
+        "change_score": change_score,
+        "carried_forward": carried_forward,
+        "carried_forward_count": last_analyzed["skips"],
+    })
+    if carried_forward:
+        print(f"Frame unchanged (score: {change_score:.4f}), carried forward previous counts")
+    return frame
+
+
+def persist_frame(frame):
+    """Pipeline stage 3: party level, Influx point and the party snapshot."""
+    if frame["refresh_job"]:
+        refresh_jobs.update(frame["refresh_job"], stage='persistence')
+    analysis = frame["analysis"]
+    image_path = frame["image_path"]
+    
+    people_count = analysis["people"]
+    street_count = analysis.get("street", 0)
+    terrace_count = analysis.get("terrace", 0)
+    car_count = analysis["cars"]
+    police_cars = analysis["police_cars"]
+    police_vans = analysis["police_vans"]
+    police_uniformed = analysis["police_uniformed"]
+    police_score = calc_police_score(police_cars, police_vans, police_uniformed)
+    
+    changes = {
+        "last_screenshot": image_path,
+        "capture_timings": frame["capture_timings"],
+        "people_count": people_count,
+        "street_count": street_count,
+        "terrace_count": terrace_count,
+        "car_count": car_count,
+        "police_count": police_cars + police_vans + police_uniformed,
+        "police_score": police_score,
+        "police_cars": police_cars,
+        "police_vans": police_vans,
+        "police_uniformed": police_uniformed,
+        "party_level": get_combined_party_level(people_count),
+        "change_score": frame["change_score"],
+        "carried_forward": frame["carried_forward"],
+        "carried_forward_count": frame["carried_forward_count"],
+        "last_updated": datetime.now().isoformat(),
+        "error": None
+    }
+    if not frame["carried_forward"]:
+        changes["last_analyzed_screenshot"] = image_path
+    
+    save_party_data(people_count, changes["party_level"], car_count, police_score,
+                   police_cars, police_vans, police_uniformed, street_count, terrace_count,
+                   frame["carried_forward"], timestamp=frame_time(image_path))
+    if police_score > 0:
+        sightings.record_sighting(frame_time(image_path), os.path.basename(image_path), people_count,
+                                  police_score, police_cars, police_vans, police_uniformed)
+    data = party_state.update(changes)
+    # Live dashboards (and the other workers): snapshot, the new frame and the chart point, in that order
+    bus.publish('party', data)
+    bus.publish('frame', {"name": os.path.basename(image_path)})
+    bus.publish('history', {"type": "party", "point": {
+        "timestamp": frame_time(image_path).isoformat(),
+        "people_count": people_count, "street_count": street_count, "terrace_count": terrace_count,
+        "party_level": data["party_level"], "car_count": car_count, "police_score": police_score,
+        "police_cars": police_cars, "police_vans": police_vans, "police_uniformed": police_uniformed,
+        "carried_forward": frame["carried_forward"]}})
+    print(f"Screenshot: {image_path}, People: {people_count} (street: {street_count}, terrace: {terrace_count}), "
+          f"Cars: {car_count}, Police: {data['police_count']} (score: {police_score}), Level: {data['party_level']}")
+    if frame["refresh_job"]:
+        refresh_jobs.update(frame["refresh_job"], status='done', result=data)
+    return frame
+
+
+def record_error(stage, frame, e):
+    """Surface a failed stage in the party snapshot, like a failed update always has."""
+    if frame and frame.get("refresh_job"):
+        refresh_jobs.update(frame["refresh_job"], status='failed', error=f"{stage}: {e}")
+    data = party_state.update({"error": f"{stage}: {e}", "last_updated": datetime.now().isoformat()})
+    bus.publish('party', data)
+
+
+# Capture keeps its cadence while analysis catches up; persistence never drops results.
+# A refresh job on a dropped frame moves to the newer frame that replaced it.
+pipeline = Pipeline([
+    Stage('capture', capture_frame, maxsize=1, policy='keep_latest'),
+    Stage('analysis', analyze_frame, maxsize=PIPELINE_QUEUE_SIZE, policy=PIPELINE_POLICY,
+          every_nth=PIPELINE_EVERY_NTH, carry=('refresh_job',)),
+    Stage('persistence', persist_frame, maxsize=100, policy='block'),
+], on_error=record_error)
+
+
+def schedule_capture():
+    """Scheduler job: queue a capture without waiting for analysis."""
+    pipeline.submit()
+
+
+def _busyness(r):
+    """Busyness as stored by save_restaurant_data: closed = 0, open without data = None (skipped)."""
+    return 0 if not r.get('is_open') else r.get('busyness')
+
+
+def _restaurant_points(data):
+    """Chart points for a refresh, shaped like /api/history: plaza averages by category, top restaurants by name."""
+    timestamp = datetime.now().astimezone().isoformat()
+    categories = {}
+    for category, items in data.items():
+        values = [_busyness(r) for r in items if _busyness(r) is not None]
+        if category != 'top' and values:
+            categories[category] = {"timestamp": timestamp, "busyness": round(sum(values) / len(values))}
+    top = {r['name']: {"timestamp": timestamp, "busyness": _busyness(r)}
+           for r in data.get('top', []) if _busyness(r) is not None}
+    return {"categories": categories, "top": top}
 
 
 def refresh_restaurant_data():
     """Background job to refresh all restaurant data."""
     try:
         # Fetch all categories (plazas + top), archived checked at 21:00 automatically
-        data, _ = fetch_restaurants(force_refresh=True)
+        data, timestamp = fetch_restaurants(force_refresh=True)
         save_restaurant_data(data)
+        bus.publish('restaurants', {"data": data, "last_updated": timestamp})
+        bus.publish('history', {"type": "restaurants", **_restaurant_points(data)})
         print(f"[{datetime.now().isoformat()}] Restaurant data refreshed")
     except Exception as e:
         print(f"Error refreshing restaurant data: {e}")
 
 
+def build_dashboard():
+    """Everything index.html needs on load, as one JSON document (see /api/dashboard)."""
+    restaurants, timestamp = fetch_restaurants()
+    history = {
+        "people": get_party_history(24, HISTORY_MAX_POINTS),
+        "plaza_daily": get_restaurant_history(24, max_points=HISTORY_MAX_POINTS),
+        "plaza_weekly": get_restaurant_history(168, max_points=HISTORY_MAX_POINTS),
+        "top_daily": get_restaurant_history_by_name(24, ['top'], HISTORY_MAX_POINTS),
+        "top_weekly": get_restaurant_history_by_name(168, ['top'], HISTORY_MAX_POINTS),
+    }
+    return json.dumps({
+        "party": party_state.get(),
+        "restaurants": {"data": restaurants, "last_updated": timestamp},
+        "history": {name: {"data": _columnar(data), "high_water": _high_water(data, None)}
+                    for name, data in history.items()},
+    })
+
+
+# Encoded once per capture/restaurant refresh (both invalidate it, see on_event), shared by every page load
+dashboard = Memo(build_dashboard, ttl=DASHBOARD_TTL)
+
+
+def on_query_invalidate(tag):
+    """New points are queryable: drop this process's dashboard, and tell the other workers."""
+    dashboard.invalidate()
+    bus.publish('_invalidate', {"tag": tag, "pid": os.getpid()})
+
+
+query_cache.add_listener(on_query_invalidate)
+
+
+def on_event(event, data):
+    """Keep this process's caches in line with events published by any worker."""
+    if event == 'party':
+        party_state.replace(data)
+        dashboard.invalidate()
+    elif event == 'restaurants':
+        dashboard.invalidate()
+    elif event == 'frame':
+        screenshot_catalog.add(data["name"])
+    elif event == '_invalidate' and data["pid"] != os.getpid():
+        query_cache.invalidate(data["tag"], notify=False)
+        dashboard.invalidate()
+    elif event == '_catalog':
+        screenshot_catalog.rebuild()
+    elif event == '_refresh' and scheduler_lock.is_leader:
+        # Joins a capture already waiting in the keep_latest queue rather than adding one
+        pipeline.submit()
+
+
+bus.on(on_event)
+
+
+@app.route('/api/dashboard')
+def get_dashboard():
+    """Party snapshot, restaurant snapshot and every chart series of index.html in one response."""
+    return app.response_class(dashboard.get(), mimetype='application/json')
+
+
+@app.after_request
+def compress(response):
+    """Brotli/gzip JSON and page responses for clients that accept it. Streams and files pass through."""
+    accept = request.headers.get('Accept-Encoding', '')
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in ('application/json', 'text/html', 'text/css', 'application/javascript')):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    if brotli is not None and 'br' in accept:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accept:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
 @app.route('/api/party')
 def get_party():
-    return jsonify(load_data())
+    """Served from memory; polls with If-None-Match get a 304 until the snapshot changes."""
+    _, body, etag, version = party_state.snapshot()
+    response = app.response_class(body, mimetype='application/json')
+    # Weak: the same snapshot may go out gzip'd or br'd
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-State-Version'] = str(version)
+    return response.make_conditional(request)
 
 
 @app.route('/api/restaurants')
@@ -120,78 +371,176 @@ def get_restaurants():
 
 @app.route('/api/history')
 def get_history():
-    """Get history data. type=party (default) or restaurants. category=top for top restaurants."""
+    """
+    Get history data. type=party (default) or restaurants. category=top for top restaurants.
+    max_points caps points per series by downsampling long ranges (0 = raw).
+    since=<timestamp> returns only newer points as {data, high_water}; pass high_water back next time
+    and replace local points at or after the first one returned.
+    format=columnar sends each series as {t: [epoch seconds], field: [values], ...} instead of rows.
+    """
     hours = request.args.get('hours', 24, type=int)
+    max_points = request.args.get('max_points', HISTORY_MAX_POINTS, type=int)
     data_type = request.args.get('type', 'party')
-    if data_type == 'restaurants':
-        category = request.args.get('category')
-        if category == 'top':
-            return jsonify(get_restaurant_history_by_name(hours, ['top']))
-        return jsonify(get_restaurant_history(hours))
-    return jsonify(get_party_history(hours))
+    since = request.args.get('since')
+    columnar = request.args.get('format', 'rows') == 'columnar'
+    try:
+        if data_type == 'restaurants':
+            category = request.args.get('category')
+            if category == 'top':
+                data = get_restaurant_history_by_name(hours, ['top'], max_points, since=since)
+            else:
+                data = get_restaurant_history(hours, max_points=max_points, since=since)
+        else:
+            data = get_party_history(hours, max_points, since=since)
+    except ValueError as e:
+        return jsonify({"error": f"bad since: {e}"}), 400
+    high_water = _high_water(data, since)
+    if columnar:
+        data = _columnar(data)
+    if since is None:
+        return jsonify(data)
+    return jsonify({"data": data, "high_water": high_water})
+
+
+def _columnar(data):
+    """Rows (a list, or a dict of lists) to columns: one epoch-seconds "t" array plus one array per field."""
+    if isinstance(data, dict):
+        return {key: _columnar(rows) for key, rows in data.items()}
+    columns = {"t": [int(datetime.fromisoformat(r["timestamp"]).timestamp()) for r in data]}
+    for field in (data[0] if data else {}):
+        if field != "timestamp":
+            columns[field] = [r[field] for r in data]
+    return columns
+
+
+def _high_water(data, since):
+    """Newest timestamp in a history result (a list, or a dict of lists), else since unchanged."""
+    series = data.values() if isinstance(data, dict) else [data]
+    latest = [s[-1]["timestamp"] for s in series if s]
+    return max(latest) if latest else since
+
+
+def _send_frame(name, immutable):
+    """Serve a frame variant (size=full|thumb|original) with ETag/Last-Modified, so repeat requests get a 304."""
+    size = request.args.get('size', 'full')
+    if size != 'original' and size not in VARIANT_SIZES:
+        return jsonify({"error": f"unknown size: {size}"}), 400
+    src = screenshot_catalog.path(name)
+    # Without max_age send_file marks the response no-cache: "latest" moves, clients revalidate with If-None-Match
+    max_age = 31536000 if immutable else None
+    if os.path.exists(src):
+        path, mimetype = get_variant(src, size)
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True,
+                             last_modified=os.path.getmtime(path), max_age=max_age)
+    else:
+        # Packed by retention into its day archive
+        archived = read_archived(SCREENSHOTS_DIR, name, size)
+        if archived is None:
+            return '', 404
+        data, mimetype = archived
+        response = send_file(io.BytesIO(data), mimetype=mimetype, conditional=True,
+                             etag=f"{name}-{size}-archived", last_modified=frame_time(name), max_age=max_age)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
 
 
 @app.route('/api/screenshot')
 def get_screenshot():
-    files = sorted(glob.glob(os.path.join(SCREENSHOTS_DIR, 'frame_*.png')))
-    if files:
-        return send_file(files[-1], mimetype='image/png')
+    latest = screenshot_catalog.latest()
+    if latest:
+        return _send_frame(latest, immutable=False)
     return '', 404
 
 
 @app.route('/api/screenshot/<filename>')
 def get_screenshot_by_name(filename):
-    """Serve a specific screenshot by filename."""
-    path = os.path.join(SCREENSHOTS_DIR, filename)
-    if os.path.exists(path):
-        return send_file(path, mimetype='image/png')
+    """Serve a specific screenshot by filename. Frames never change, so they are cached for good."""
+    if filename in screenshot_catalog:
+        return _send_frame(filename, immutable=True)
     return '', 404
 
 
 @app.route('/api/police-sightings')
 def get_police_sightings_api():
-    """Return all police sightings with matched screenshot filenames."""
-    sightings = get_police_sightings()
-    files = sorted(glob.glob(os.path.join(SCREENSHOTS_DIR, 'frame_*.png')))
-    file_times = []
-    for f in files:
-        name = os.path.basename(f)
-        # frame_20260129_121152.png -> 2026-01-29T12:11:52
-        try:
-            ts = name[6:21]  # 20260129_121152
-            file_times.append((name, ts))
-        except:
-            pass
-    
-    for s in sightings:
-        # Find closest screenshot to this timestamp
-        ts = s['timestamp'][:19].replace('-', '').replace('T', '_').replace(':', '')  # 20260129_121746
-        best = None
-        for fname, ftime in file_times:
-            if ftime <= ts:
-                best = fname
-            else:
-                break
-        s['screenshot'] = best
-    
-    return jsonify(sightings)
+    """Police sightings newest first, one page at a time. Pass next_cursor back as cursor for older ones."""
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    return jsonify(sightings.get_sightings(limit, request.args.get('cursor')))
+
+
+@app.route('/api/police-incidents')
+def get_police_incidents_api():
+    """Consecutive sightings grouped into incidents, newest first, paged like /api/police-sightings."""
+    limit = min(request.args.get('limit', 50, type=int), 1000)
+    return jsonify(sightings.get_incidents(limit, request.args.get('cursor')))
+
+
+def import_sightings():
+    """Startup: fill an empty sightings index from Influx history (one-off full scan)."""
+    try:
+        if sightings.is_empty():
+            sightings.import_history(get_police_sightings(), screenshot_catalog)
+    except Exception as e:
+        print(f"[ERROR] sightings import: {e}", flush=True)
+
+
+@app.route('/api/events')
+def events():
+    """SSE stream of party, frame, restaurants and history events. Reconnects resume via Last-Event-ID."""
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    q = broker.subscribe(last_event_id)
+    if q is None:
+        # Keep threads free for the API; the page falls back to polling and tries again later
+        return jsonify({"error": "too many live connections"}), 503, {"Retry-After": "60"}
+    response = Response(stream_with_context(broker.stream(q)), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Frees the slot even if the client went away before the stream started
+    response.call_on_close(lambda: broker.unsubscribe(q))
+    return response
+
+
+@app.route('/api/stats')
+def get_stats():
+    """Pipeline internals: per-stage throughput/lag, analysis worker and cache counters."""
+    return jsonify({"pipeline": pipeline.stats(), "analyzer": analyzer_worker.stats(),
+                    "analysis_cache": analysis_cache.stats(), "events": broker.stats(), "dashboard": dashboard.stats(),
+                    "query_cache": query_cache.stats(), "party_state": party_state.stats(),
+                    "scheduler": {"pid": os.getpid(), "leader": scheduler_lock.is_leader}})
 
 
 @app.route('/api/update', methods=['POST'])
 def update_count():
-    data = load_data()
     count = request.json.get('people_count', 0)
-    data['people_count'] = count
-    data['party_level'] = get_combined_party_level(count)
-    data['last_updated'] = datetime.now().isoformat()
-    save_data(data)
+    data = party_state.update({"people_count": count, "party_level": get_combined_party_level(count),
+                               "last_updated": datetime.now().isoformat()})
+    bus.publish('party', data)
     return jsonify(data)
 
 
 @app.route('/api/refresh', methods=['POST'])
 def refresh():
-    update_party_data()
-    return jsonify(load_data())
+    """
+    Queue a capture + analysis and return its job at once (202). Requests while a job is queued
+    or running join it; a new job within REFRESH_MIN_INTERVAL of the last one gets 429.
+    """
+    job, retry_after = refresh_jobs.request()
+    if job is None:
+        return jsonify({"error": "refresh requested too recently", "retry_after": retry_after}), 429, \
+            {"Retry-After": str(retry_after)}
+    if job["requests"] == 1:
+        # Whichever worker holds the scheduler starts the capture
+        bus.publish('_refresh', {"job": job["id"]})
+    return jsonify(job), 202, {"Location": f"/api/refresh/{job['id']}"}
+
+
+@app.route('/api/refresh/<job_id>')
+def refresh_status(job_id):
+    """status: queued/running/done/failed, stage: capture/analysis/persistence, result: party data when done."""
+    job = refresh_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job)
 
 
 @app.route('/')
@@ -204,11 +553,50 @@ def police_page():
     return send_from_directory(app.static_folder, 'police.html')
 
 
-if __name__ == '__main__':
+def retention_job():
+    """Scheduler job: retention, then every worker re-reads its catalog."""
+    run_retention(screenshot_catalog)
+    bus.publish('_catalog', {})
+
+
+def start_scheduler():
+    """Runs in the one process holding the scheduler lock: capture, analysis and every periodic job."""
+    capture_session.start()
+    analyzer_worker.start()
+    pipeline.start()
     scheduler = BackgroundScheduler()
-    scheduler.add_job(update_party_data, 'interval', seconds=SCREENSHOT_INTERVAL)
+    scheduler.add_job(schedule_capture, 'interval', seconds=SCREENSHOT_INTERVAL)
     scheduler.add_job(refresh_restaurant_data, 'interval', minutes=30)
+    scheduler.add_job(rollup_recent, 'cron', args=['hourly'], minute=5)
+    scheduler.add_job(rollup_recent, 'cron', args=['daily'], hour=0, minute=15)
+    scheduler.add_job(init_rollups, 'date')
+    scheduler.add_job(import_sightings, 'date')
+    scheduler.add_job(retention_job, 'cron', hour=3, minute=30)
     scheduler.start()
-    scheduler.add_job(update_party_data, 'date', run_date=datetime.now().replace(microsecond=0).isoformat())
+    schedule_capture()
+
+
+scheduler_lock = LeaderLock(SCHEDULER_LOCK_FILE, start_scheduler)
+_started = False
+
+
+def create_app():
+    """
+    Per-process startup, once per WSGI worker (don't preload): screenshot catalog, event bus,
+    and a bid for the scheduler lock. Every worker serves the API; only the lock holder
+    captures and runs jobs, and another worker takes over if it dies.
+    """
+    global _started
+    if not _started:
+        _started = True
+        screenshot_catalog.rebuild()
+        party_state.load()
+        bus.start()
+        scheduler_lock.start()
+    return app
+
+
+if __name__ == '__main__':
+    create_app()
     print(f"Starting server on port {PORT}, screenshot interval: {SCREENSHOT_INTERVAL}s")
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)
@@ -0,0 +1,89 @@
+"""
+Per-day zip archives of down-encoded frames: screenshots/archive/20260129.zip holds
+frame_20260129_121152_full.webp and frame_20260129_121152_thumb.webp for each kept frame.
+Frames keep their frame_*.png name everywhere else (catalog, sightings, URLs).
+"""
+import os
+import zipfile
+
+from variants import MIMETYPES
+
+PRUNED = b'pruned'  # Zip comment: only sighting/peak frames are left
+
+
+def archive_dir(directory):
+    return os.path.join(directory, 'archive')
+
+
+def archive_path(directory, name):
+    """Day archive a frame belongs to."""
+    return os.path.join(archive_dir(directory), f'{name[6:14]}.zip')
+
+
+def member_prefix(name, size):
+    return f'{os.path.splitext(name)[0]}_{size}.'
+
+
+def archived_frames(path):
+    """Names of the frames in one day archive, from its central directory (no decompression)."""
+    with zipfile.ZipFile(path) as zf:
+        return {frame_of(m) for m in zf.namelist()}
+
+
+def list_archived(directory):
+    """Names of every archived frame."""
+    names = set()
+    if not os.path.isdir(archive_dir(directory)):
+        return names
+    for entry in os.scandir(archive_dir(directory)):
+        if not entry.name.endswith('.zip'):
+            continue
+        try:
+            names |= archived_frames(entry.path)
+        except zipfile.BadZipFile as e:
+            print(f"[ERROR] archive {entry.name}: {e}", flush=True)
+    return names
+
+
+def read_archived(directory, name, size):
+    """Returns: bytes, mimetype - or None if the frame is not archived. 'original' falls back to 'full'."""
+    path = archive_path(directory, name)
+    if not os.path.exists(path):
+        return None
+    prefix = member_prefix(name, 'full' if size == 'original' else size)
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            if member.startswith(prefix):
+                return zf.read(member), MIMETYPES[member.rsplit('.', 1)[1]]
+    return None
+
+
+def frame_of(member):
+    """frame_20260129_121152_thumb.webp -> frame_20260129_121152.png"""
+    return member.rsplit('_', 1)[0] + '.png'
+
+
+def is_pruned(path):
+    with zipfile.ZipFile(path) as zf:
+        return zf.comment == PRUNED
+
+
+def rewrite_archive(path, files=(), keep=None, pruned=False):
+    """
+    Atomically rebuild a day archive from its existing members (those whose frame is in keep,
+    all if keep is None) plus files, a list of (arcname, path). Stored: WebP/JPEG don't deflate.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    added = {arcname for arcname, _ in files}
+    tmp = path + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_STORED) as out:
+        if os.path.exists(path):
+            with zipfile.ZipFile(path) as old:
+                for info in old.infolist():
+                    if info.filename not in added and (keep is None or frame_of(info.filename) in keep):
+                        out.writestr(info, old.read(info.filename))
+        for arcname, src in files:
+            out.write(src, arcname)
+        if pruned:
+            out.comment = PRUNED
+    os.replace(tmp, path)
@@ -0,0 +1,173 @@
+"""
+Re-analyze archived screenshots and write the results to InfluxDB at each frame's capture time.
+
+    python backfill.py --start 2026-01-27 --end 2026-01-31 --workers 2
+    python backfill.py --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SCREENSHOT_INTERVAL
+from screenshot import SCREENSHOTS_DIR, frame_time
+from analyzer import analyze_image, get_party_level, calc_police_score, PROMPT_VERSION
+from database import party_point, save_party_points, delete_party_points
+from rollups import ROLLUPS, rollup, _floor
+import sightings
+
+CHECKPOINT_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'backfill_checkpoint.json')
+
+
+def list_frames(start=None, end=None):
+    """Frame filenames in capture order, optionally limited to a YYYY-MM-DD range (inclusive)."""
+    lo = f"frame_{start.replace('-', '')}" if start else None
+    hi = f"frame_{end.replace('-', '')}_999999" if end else None
+    names = []
+    for entry in os.scandir(SCREENSHOTS_DIR):
+        name = entry.name
+        if not (name.startswith('frame_') and name.endswith('.png')):
+            continue
+        if (lo and name < lo) or (hi and name > hi):
+            continue
+        names.append(name)
+    return sorted(names)
+
+
+def load_checkpoint():
+    """Frames already written for the current prompt version."""
+    if os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("prompt_version") == PROMPT_VERSION:
+            return set(checkpoint.get("done", []))
+        print(f"Checkpoint is for prompt version {checkpoint.get('prompt_version')}, starting over")
+    return set()
+
+
+def save_checkpoint(done):
+    os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+    tmp = CHECKPOINT_FILE + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({"prompt_version": PROMPT_VERSION, "done": sorted(done)}, f)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+def to_point(name, analysis):
+    """Influx point for one analyzed frame. Party level is from people only, no historic restaurant data."""
+    police_score = calc_police_score(analysis["police_cars"], analysis["police_vans"], analysis["police_uniformed"])
+    return party_point(analysis["people"], get_party_level(analysis["people"]), analysis["cars"], police_score,
+                       analysis["police_cars"], analysis["police_vans"], analysis["police_uniformed"],
+                       analysis.get("street", 0), analysis.get("terrace", 0), timestamp=frame_time(name))
+
+
+def replace_spans(names, next_frame):
+    """
+    (start, stop) spans covering each frame's live point (written up to an interval after capture)
+    but never another frame's: a span ends before the next frame in range, and frames skipped as
+    done split it, so their points are kept.
+    """
+    spans = []
+    prev = None
+    for name in names:
+        start = frame_time(name)
+        stop = start + timedelta(seconds=SCREENSHOT_INTERVAL - 1)
+        if next_frame.get(name):
+            stop = min(stop, frame_time(next_frame[name]) - timedelta(seconds=1))
+        if spans and next_frame.get(prev) == name:
+            spans[-1][1] = stop
+        else:
+            spans.append([start, stop])
+        prev = name
+    return spans
+
+
+def to_sighting(name, analysis):
+    """Sightings index row for a frame with police in it, else None."""
+    police_score = calc_police_score(analysis["police_cars"], analysis["police_vans"], analysis["police_uniformed"])
+    if police_score <= 0:
+        return None
+    return (frame_time(name), name, analysis["people"], police_score,
+            analysis["police_cars"], analysis["police_vans"], analysis["police_uniformed"])
+
+
+def flush(batch, done, next_frame=None):
+    """
+    Write a batch of (name, analysis) to Influx and the sightings index, then checkpoint it.
+    With next_frame, replace existing points first.
+    """
+    if not batch:
+        return
+    names = [name for name, _ in batch]
+    if next_frame is not None:
+        spans = replace_spans(names, next_frame)
+        for start, stop in spans:
+            delete_party_points(start, stop)
+    else:
+        # Same-timestamp points are overwritten; so is each frame's own sighting
+        spans = [(frame_time(name), frame_time(name)) for name in names]
+    save_party_points([to_point(name, analysis) for name, analysis in batch])
+    sightings.replace_sightings(spans, [row for row in (to_sighting(name, a) for name, a in batch) if row])
+    done.update(names)
+    save_checkpoint(done)
+    print(f"Wrote {len(batch)} points up to {batch[-1][0]} ({len(done)} done)", flush=True)
+    batch.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill party history from archived screenshots")
+    parser.add_argument('--start', help="first day, YYYY-MM-DD")
+    parser.add_argument('--end', help="last day, YYYY-MM-DD (inclusive)")
+    parser.add_argument('--workers', type=int, default=2, help="frames analyzed in parallel")
+    parser.add_argument('--batch-size', type=int, default=50, help="points per Influx write")
+    parser.add_argument('--dry-run', action='store_true', help="list what would be analyzed, write nothing")
+    parser.add_argument('--replace', action='store_true', help="delete the existing party points of each analyzed frame first")
+    parser.add_argument('--restart', action='store_true', help="ignore the checkpoint")
+    args = parser.parse_args()
+
+    frames = list_frames(args.start, args.end)
+    done = set() if args.restart else load_checkpoint()
+    pending = [name for name in frames if name not in done]
+    print(f"{len(frames)} frames in range, {len(frames) - len(pending)} already done, {len(pending)} to analyze "
+          f"(prompt version {PROMPT_VERSION})")
+    if args.dry_run:
+        if pending:
+            print(f"First: {pending[0]}, last: {pending[-1]}")
+        return 0
+
+    # Frame after each one in range, done or not, to bound what --replace deletes
+    next_frame = dict(zip(frames, frames[1:])) if args.replace else None
+    batch = []
+    incomplete = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        # map() yields in submission order, so batches stay chronological
+        results = pool.map(lambda name: (name, *analyze_image(os.path.join(SCREENSHOTS_DIR, name), with_status=True)),
+                           pending)
+        for name, analysis, complete in results:
+            if not complete:
+                # Failed kiro-cli calls count as zeros: keep the stored point, leave it for a rerun
+                print(f"Skipped {name}: analysis incomplete", flush=True)
+                incomplete.append(name)
+                continue
+            batch.append((name, analysis))
+            if len(batch) >= args.batch_size:
+                flush(batch, done, next_frame)
+    flush(batch, done, next_frame)
+    if pending:
+        # Refresh hourly/daily aggregates over the rewritten days, as whole UTC days like the
+        # windows themselves (local midnights would cut a day's window in two)
+        start = _floor(frame_time(pending[0]).astimezone(timezone.utc), "daily")
+        stop = _floor(frame_time(pending[-1]).astimezone(timezone.utc), "daily") + timedelta(days=1)
+        for name in ROLLUPS:
+            rollup(name, start, stop)
+    print(f"Backfill complete: {len(done)} frames")
+    if incomplete:
+        print(f"{len(incomplete)} frames incomplete (first: {incomplete[0]}), rerun the same command to retry them")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Sorted in-memory index of frame_*.png names, so endpoints never glob the screenshots directory
+"""
+import os
+import bisect
+import threading
+
+from archive import list_archived
+
+
+def frame_name(ts):
+    """Filename a frame captured at ts would have (names use local time, like _frame_path)."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone().replace(tzinfo=None)
+    return ts.strftime('frame_%Y%m%d_%H%M%S.png')
+
+
+class ScreenshotCatalog:
+    """
+    Frame names in capture order, on disk or in a day archive. Names sort like their
+    timestamps, so lookups are a bisect and appends (the normal capture case) are O(1).
+    Whatever deletes frames for good calls remove(); rebuild() resyncs with the disk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._names = []
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        names = list_archived(self.directory)
+        if os.path.isdir(self.directory):
+            names.update(e.name for e in os.scandir(self.directory)
+                         if e.name.startswith('frame_') and e.name.endswith('.png'))
+        names = sorted(names)
+        with self._lock:
+            self._names = names
+        print(f"[catalog] {len(names)} screenshots", flush=True)
+        return len(names)
+
+    def add(self, name):
+        name = os.path.basename(name)
+        with self._lock:
+            if not self._names or name > self._names[-1]:
+                self._names.append(name)
+                return
+            i = bisect.bisect_left(self._names, name)
+            if i == len(self._names) or self._names[i] != name:
+                self._names.insert(i, name)
+
+    def remove(self, name):
+        name = os.path.basename(name)
+        with self._lock:
+            i = bisect.bisect_left(self._names, name)
+            if i < len(self._names) and self._names[i] == name:
+                del self._names[i]
+
+    def latest(self):
+        with self._lock:
+            return self._names[-1] if self._names else None
+
+    def at_or_before(self, ts):
+        """Newest frame captured at or before ts (a datetime), or None."""
+        key = frame_name(ts)
+        with self._lock:
+            i = bisect.bisect_right(self._names, key)
+            return self._names[i - 1] if i else None
+
+    def __contains__(self, name):
+        with self._lock:
+            i = bisect.bisect_left(self._names, name)
+            return i < len(self._names) and self._names[i] == name
+
+    def __len__(self):
+        return len(self._names)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
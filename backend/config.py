@@ -3,11 +3,95 @@ import os
 # Screenshot interval (seconds)
 SCREENSHOT_INTERVAL = int(os.getenv('SCREENSHOT_INTERVAL', 300))  # 5 min default
 
+# Recycle the persistent capture browser after N frames (0 = never)
+CAPTURE_RELAUNCH_AFTER = int(os.getenv('CAPTURE_RELAUNCH_AFTER', 288))  # ~1 day at 5 min
+
+# Player readiness: YouTube quality label and max wait per stage (ms)
+CAPTURE_QUALITY = os.getenv('CAPTURE_QUALITY', 'hd720')
+READY_TIMEOUT_MS = int(os.getenv('READY_TIMEOUT_MS', 15000))
+
+# Change detection: skip AI analysis when less than this fraction of the frame changed
+CHANGE_THRESHOLD = float(os.getenv('CHANGE_THRESHOLD', 0.003))
+CHANGE_MAX_SKIPS = int(os.getenv('CHANGE_MAX_SKIPS', 6))  # Force analysis after N carried-forward frames
+
+# AI analysis: 'sequential' (two kiro-cli calls), 'parallel' (both at once) or 'fused' (one call)
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'sequential')
+ANALYSIS_CONCURRENCY = int(os.getenv('ANALYSIS_CONCURRENCY', 2))
+KIRO_TIMEOUT = int(os.getenv('KIRO_TIMEOUT', 120))  # Seconds per kiro-cli call
+ANALYZER_WORKERS = int(os.getenv('ANALYZER_WORKERS', 1))  # Long-lived analysis worker threads
+ANALYSIS_JOB_TIMEOUT = int(os.getenv('ANALYSIS_JOB_TIMEOUT', 300))  # Seconds per frame, queueing included
+ANALYSIS_CACHE_SIZE = int(os.getenv('ANALYSIS_CACHE_SIZE', 5000))  # Cached results by image hash
+
+# Pipeline backpressure when analysis falls behind capture:
+# 'keep_latest', 'drop_oldest', 'every_nth' (analyze every Nth frame) or 'block'
+PIPELINE_POLICY = os.getenv('PIPELINE_POLICY', 'keep_latest')
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 3))
+PIPELINE_EVERY_NTH = int(os.getenv('PIPELINE_EVERY_NTH', 1))
+
+# Counting backend: 'kiro' (kiro-cli only), 'local' (CPU detector only, no police),
+# 'hybrid' (local counts, kiro-cli for police and for low-confidence frames) or 'stub' (fixed counts, for tests)
+ANALYZER_BACKEND = os.getenv('ANALYZER_BACKEND', 'kiro')
+LOCAL_MODEL_PATH = os.getenv('LOCAL_MODEL_PATH', os.path.join(os.path.dirname(__file__), '..', 'models', 'yolov8n.onnx'))
+LOCAL_MIN_SCORE = float(os.getenv('LOCAL_MIN_SCORE', 0.25))  # Detections below this are ignored
+LOCAL_MIN_CONFIDENCE = float(os.getenv('LOCAL_MIN_CONFIDENCE', 0.7))  # Hybrid escalates below this
+
+# Regions of interest as (left, top, right, bottom) fractions of the frame, None = full frame.
+# Police prompt sees 'road', people prompt sees street + terrace.
+ROIS = {
+    "road": None,
+    "street": None,
+    "terrace": None,
+}
+ROI_MAX_WIDTH = int(os.getenv('ROI_MAX_WIDTH', 0))  # Downscale crops wider than this (0 = keep size)
+ROI_SPLIT_PEOPLE = os.getenv('ROI_SPLIT_PEOPLE', '0') == '1'  # Count street/terrace with a prompt per region
+
 # Party level thresholds: (max_people, level)
 PARTY_THRESHOLDS = [(0, 0), (2, 1), (5, 2), (10, 3), (20, 4), (50, 5), (70, 7), (100, 9), (999, 10)]
 
 # YouTube stream
 YOUTUBE_URL = "https://www.youtube.com/watch?v=L9HyLjRVN8E"
 
+# History API: ranges with more points than this are downsampled server-side (0 = raw)
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', 1000))
+
+# Influx query results are cached until a write of the same measurement lands, or for this many seconds
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 256))
+QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', 300))
+
+# /api/dashboard is rebuilt on capture/restaurant refresh, or at the latest after this many seconds
+DASHBOARD_TTL = int(os.getenv('DASHBOARD_TTL', SCREENSHOT_INTERVAL))
+
+# POST /api/refresh: at most one forced capture per this many seconds (joining a running one is always allowed)
+REFRESH_MIN_INTERVAL = int(os.getenv('REFRESH_MIN_INTERVAL', 60))
+REFRESH_JOB_TIMEOUT = int(os.getenv('REFRESH_JOB_TIMEOUT', 600))  # Then a job still queued/running is failed
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 500))
+
+# Rollup tiers: history ranges longer than these many hours read hourly/daily aggregates
+ROLLUP_HOURLY_AFTER_HOURS = int(os.getenv('ROLLUP_HOURLY_AFTER_HOURS', 168))  # > 7d
+ROLLUP_DAILY_AFTER_HOURS = int(os.getenv('ROLLUP_DAILY_AFTER_HOURS', 2160))  # > 90d
+ROLLUP_HOURLY_RETENTION_DAYS = int(os.getenv('ROLLUP_HOURLY_RETENTION_DAYS', 730))
+ROLLUP_DAILY_RETENTION_DAYS = int(os.getenv('ROLLUP_DAILY_RETENTION_DAYS', 0))  # 0 = forever
+
+# Screenshot variants served by /api/screenshot (size=full|thumb|original)
+VARIANT_FORMAT = os.getenv('VARIANT_FORMAT', 'webp')  # webp or jpeg
+VARIANT_QUALITY = int(os.getenv('VARIANT_QUALITY', 80))
+THUMB_WIDTH = int(os.getenv('THUMB_WIDTH', 320))
+
+# Screenshot retention: PNGs older than FULL_DAYS are packed into per-day archives of variants,
+# archives older than ARCHIVE_DAYS keep only sighting and peak frames (0 = never)
+RETENTION_FULL_DAYS = int(os.getenv('RETENTION_FULL_DAYS', 14))
+RETENTION_ARCHIVE_DAYS = int(os.getenv('RETENTION_ARCHIVE_DAYS', 90))
+RETENTION_PEAKS_PER_DAY = int(os.getenv('RETENTION_PEAKS_PER_DAY', 12))
+
+# Police sightings closer together than this are grouped into one incident
+INCIDENT_GAP_SECONDS = int(os.getenv('INCIDENT_GAP_SECONDS', SCREENSHOT_INTERVAL * 3 // 2))
+
 # Server
 PORT = int(os.getenv('PORT', 5050))
+# gunicorn processes; each holds WEB_THREADS requests (open SSE streams included)
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', 2))
+WEB_THREADS = int(os.getenv('WEB_THREADS', 16))
+# Open /api/events streams per worker, each holding one of its threads; beyond this dashboards poll
+SSE_MAX_SUBSCRIBERS = int(os.getenv('SSE_MAX_SUBSCRIBERS', max(1, WEB_THREADS // 2)))
@@ -1,171 +1,389 @@
 import os
-from influxdb_client import InfluxDBClient, Point
+import math
+import time
+import atexit
+import inspect
+import functools
+import threading
+from datetime import datetime, timedelta, timezone
+from influxdb_client import InfluxDBClient, Point, WriteOptions
 from influxdb_client.client.write_api import SYNCHRONOUS
 
+from config import (SCREENSHOT_INTERVAL, ROLLUP_HOURLY_AFTER_HOURS, ROLLUP_DAILY_AFTER_HOURS,
+                    QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+from query_cache import QueryCache
+
 INFLUX_URL = "http://localhost:8086"
 INFLUX_TOKEN = os.getenv('INFLUXDB_TOKEN')
 INFLUX_ORG = "reusparty"
 INFLUX_BUCKET = "party_data"
+HOURLY_BUCKET = "party_data_hourly"
+DAILY_BUCKET = "party_data_daily"
+
+# Rollup tiers (filled by rollups.py): (bucket, resolution seconds, used for ranges longer than hours)
+ROLLUP_TIERS = [
+    (DAILY_BUCKET, 86400, ROLLUP_DAILY_AFTER_HOURS),
+    (HOURLY_BUCKET, 3600, ROLLUP_HOURLY_AFTER_HOURS),
+]
+
+# Batched writes: flush every N points or every N ms, retry with exponential backoff
+INFLUX_BATCH_SIZE = int(os.getenv('INFLUX_BATCH_SIZE', 500))
+INFLUX_FLUSH_INTERVAL_MS = int(os.getenv('INFLUX_FLUSH_INTERVAL_MS', 1000))
+INFLUX_MAX_RETRIES = int(os.getenv('INFLUX_MAX_RETRIES', 5))
+
+_client = None
+_write_api = None
+_lock = threading.Lock()
+
+# Query results by measurement ("party", "restaurant"), dropped when writes of it land
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+
+def cached(tag):
+    """Serve a query function from query_cache, keyed by its arguments (defaults filled in, by name)."""
+    def wrap(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            # f(24, 1000) and f(24, 1000, since=None) are the same query, share one entry
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = repr((fn.__name__, sorted(bound.arguments.items())))
+            return query_cache.get(key, tag, lambda: fn(*args, **kwargs))
+        return inner
+    return wrap
+
+
+def _measurements(data):
+    """Measurement names in a line-protocol batch."""
+    if isinstance(data, bytes):
+        data = data.decode()
+    return {line.split(',', 1)[0].split(' ', 1)[0] for line in data.splitlines() if line}
 
 
 def get_client():
-    return InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
+    """Shared client, created on first use and reused by every query and write."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
+            atexit.register(close_client)
+        return _client
+
+
+def _on_write_error(conf, data, exception):
+    print(f"[ERROR] Influx batch write failed after retries: {exception}", flush=True)
+
+
+def _on_write_success(conf, data):
+    # Invalidate only once the batch is stored, so a query in between can't re-cache old data
+    for measurement in _measurements(data):
+        query_cache.invalidate('restaurant' if measurement == 'top_restaurant' else measurement)
+
+
+def get_write_api():
+    """Shared batching write API. Writes return immediately and are flushed in the background."""
+    global _write_api
+    client = get_client()
+    with _lock:
+        if _write_api is None:
+            _write_api = client.write_api(
+                write_options=WriteOptions(batch_size=INFLUX_BATCH_SIZE, flush_interval=INFLUX_FLUSH_INTERVAL_MS,
+                                           retry_interval=1000, max_retries=INFLUX_MAX_RETRIES, exponential_base=2),
+                success_callback=_on_write_success, error_callback=_on_write_error)
+        return _write_api
+
+
+def close_client():
+    """Flush pending batches and close the shared client."""
+    global _client, _write_api
+    with _lock:
+        if _write_api is not None:
+            _write_api.close()
+            _write_api = None
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _write_now(records):
+    """Synchronous write with retry/backoff, for callers that must know the data landed."""
+    write_api = get_client().write_api(write_options=SYNCHRONOUS)
+    for attempt in range(INFLUX_MAX_RETRIES + 1):
+        try:
+            write_api.write(bucket=INFLUX_BUCKET, record=records)
+            break
+        except Exception as e:
+            if attempt == INFLUX_MAX_RETRIES:
+                raise
+            delay = 2 ** attempt
+            print(f"[ERROR] Influx write failed ({e}), retrying in {delay}s", flush=True)
+            time.sleep(delay)
+    query_cache.invalidate('party')  # Only party points are written synchronously
+
+
+def party_point(people_count, party_level, car_count=0, police_score=0, 
+                police_cars=0, police_vans=0, police_uniformed=0, 
+                street_count=0, terrace_count=0, carried_forward=False, timestamp=None):
+    """Build a 'party' point. timestamp: frame capture time (None = now)."""
+    point = (Point("party")
+        .field("people_count", people_count)
+        .field("party_level", party_level)
+        .field("car_count", car_count)
+        .field("police_score", police_score)
+        .field("police_cars", police_cars)
+        .field("police_vans", police_vans)
+        .field("police_uniformed", police_uniformed)
+        .field("street_count", street_count)
+        .field("terrace_count", terrace_count)
+        .field("carried_forward", int(carried_forward)))
+    if timestamp is not None:
+        point = point.time(timestamp)
+    return point
 
 
 def save_party_data(people_count, party_level, car_count=0, police_score=0, 
                     police_cars=0, police_vans=0, police_uniformed=0, 
-                    street_count=0, terrace_count=0):
-    with get_client() as client:
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-        point = (Point("party")
-            .field("people_count", people_count)
-            .field("party_level", party_level)
-            .field("car_count", car_count)
-            .field("police_score", police_score)
-            .field("police_cars", police_cars)
-            .field("police_vans", police_vans)
-            .field("police_uniformed", police_uniformed)
-            .field("street_count", street_count)
-            .field("terrace_count", terrace_count))
-        write_api.write(bucket=INFLUX_BUCKET, record=point)
+                    street_count=0, terrace_count=0, carried_forward=False, timestamp=None):
+    point = party_point(people_count, party_level, car_count, police_score,
+                        police_cars, police_vans, police_uniformed,
+                        street_count, terrace_count, carried_forward, timestamp)
+    get_write_api().write(bucket=INFLUX_BUCKET, record=point)
+
+
+def save_party_points(points):
+    """Write many 'party' points (see party_point) in one request, waiting until stored."""
+    _write_now(points)
+
+
+def delete_party_points(start, stop):
+    """Delete 'party' points between two datetimes (inclusive)."""
+    get_client().delete_api().delete(start, stop, '_measurement="party"', bucket=INFLUX_BUCKET, org=INFLUX_ORG)
+    query_cache.invalidate('party')
 
 
 def save_restaurant_data(restaurants_by_category):
-    """Save all restaurant data to unified 'restaurant' measurement."""
-    with get_client() as client:
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-        for category, items in restaurants_by_category.items():
-            for r in items:
-                # Closed = 0, Open + busyness = actual, Open + no busyness = skip
-                if not r.get('is_open'):
-                    busyness = 0
-                elif r.get('busyness') is not None:
-                    busyness = r.get('busyness')
-                else:
-                    continue
-                point = (Point("restaurant")
-                    .tag("name", r['name'])
-                    .tag("category", category)
-                    .field("busyness", busyness))
-                write_api.write(bucket=INFLUX_BUCKET, record=point)
+    """Save all restaurant data to unified 'restaurant' measurement, as one batch."""
+    points = []
+    for category, items in restaurants_by_category.items():
+        for r in items:
+            # Closed = 0, Open + busyness = actual, Open + no busyness = skip
+            if not r.get('is_open'):
+                busyness = 0
+            elif r.get('busyness') is not None:
+                busyness = r.get('busyness')
+            else:
+                continue
+            points.append(Point("restaurant")
+                .tag("name", r['name'])
+                .tag("category", category)
+                .field("busyness", busyness))
+    if points:
+        get_write_api().write(bucket=INFLUX_BUCKET, record=points)
 
 
+@cached('party')
 def get_police_sightings():
     """Get all timestamps where police_score > 0."""
-    with get_client() as client:
-        query = f'''from(bucket: "{INFLUX_BUCKET}")
-            |> range(start: 0)
-            |> filter(fn: (r) => r._measurement == "party")
-            |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-            |> filter(fn: (r) => r.police_score > 0)
-            |> sort(columns: ["_time"], desc: true)'''
-        result = client.query_api().query(query)
-        data = []
-        for table in result:
-            for record in table.records:
-                data.append({
-                    "timestamp": record.get_time().isoformat(),
-                    "people_count": record.values.get("people_count") or 0,
-                    "police_score": record.values.get("police_score") or 0,
-                    "police_cars": record.values.get("police_cars") or 0,
-                    "police_vans": record.values.get("police_vans") or 0,
-                    "police_uniformed": record.values.get("police_uniformed") or 0
-                })
-        return data
+    client = get_client()
+    query = f'''from(bucket: "{INFLUX_BUCKET}")
+        |> range(start: 0)
+        |> filter(fn: (r) => r._measurement == "party")
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> filter(fn: (r) => r.police_score > 0)
+        |> sort(columns: ["_time"], desc: true)'''
+    result = client.query_api().query(query)
+    data = []
+    for table in result:
+        for record in table.records:
+            data.append({
+                "timestamp": record.get_time().isoformat(),
+                "people_count": record.values.get("people_count") or 0,
+                "police_score": record.values.get("police_score") or 0,
+                "police_cars": record.values.get("police_cars") or 0,
+                "police_vans": record.values.get("police_vans") or 0,
+                "police_uniformed": record.values.get("police_uniformed") or 0
+            })
+    return data
+
+
+def get_party_peaks(start, stop, top=10):
+    """Times of the `top` highest people counts between two datetimes, for keeping their frames."""
+    start, stop = start.astimezone(timezone.utc), stop.astimezone(timezone.utc)
+    query = f'''from(bucket: "{INFLUX_BUCKET}")
+        |> range(start: {start.strftime("%Y-%m-%dT%H:%M:%SZ")}, stop: {stop.strftime("%Y-%m-%dT%H:%M:%SZ")})
+        |> filter(fn: (r) => r._measurement == "party" and r._field == "people_count")
+        |> filter(fn: (r) => r._value > 0)
+        |> group()
+        |> top(n: {top})'''
+    result = get_client().query_api().query(query)
+    return [record.get_time() for table in result for record in table.records]
+
+
+def _tier(hours, raw_resolution):
+    """Coarsest bucket whose resolution still suits the range. Returns: bucket, resolution seconds"""
+    for bucket, resolution, after_hours in ROLLUP_TIERS:
+        if hours > after_hours:
+            return bucket, resolution
+    return INFLUX_BUCKET, raw_resolution
+
+
+def _window_seconds(hours, max_points, resolution):
+    """Aggregation window that keeps a range under max_points, or None if the data already fits."""
+    if not max_points:
+        return None
+    seconds = math.ceil(hours * 3600 / max_points)
+    return seconds if seconds > resolution else None
+
+
+def _range(hours, since=None, exclusive=False):
+    """
+    Flux range for the last `hours`, or from `since` (ISO timestamp) when that is newer.
+    Windowed queries re-read from since (a window start, so the last partial window is
+    recomputed); raw ones are exclusive, so only points after since come back.
+    """
+    if not since:
+        return f'range(start: -{hours}h)'
+    start = datetime.fromisoformat(since.replace('Z', '+00:00'))
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if exclusive:
+        start += timedelta(microseconds=1)
+    start = max(start, datetime.now(timezone.utc) - timedelta(hours=hours))
+    return f'range(start: {start.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")})'
 
 
-def get_party_history(hours=24):
-    with get_client() as client:
-        query = f'''from(bucket: "{INFLUX_BUCKET}")
-            |> range(start: -{hours}h)
-            |> filter(fn: (r) => r._measurement == "party")
+@cached('party')
+def get_party_history(hours=24, max_points=None, since=None):
+    """
+    Party points for the last `hours`, read from the coarsest rollup tier that fits.
+    With max_points, long ranges are downsampled server-side: counts averaged per
+    window, police fields take the window max so sightings survive.
+    since: only points from this timestamp on (see _range); raises ValueError if malformed.
+    """
+    bucket, resolution = _tier(hours, SCREENSHOT_INTERVAL)
+    window = _window_seconds(hours, max_points, resolution)
+    source = f'''from(bucket: "{bucket}")
+        |> {_range(hours, since, exclusive=not window)}
+        |> filter(fn: (r) => r._measurement == "party")'''
+    if window:
+        # Windows are stamped with their start, so a since cursor lands on a window boundary
+        query = f'''data = {source}
+        peaks = data
+            |> filter(fn: (r) => r._field =~ /^police_/)
+            |> aggregateWindow(every: {window}s, fn: max, createEmpty: false, timeSrc: "_start")
+        means = data
+            |> filter(fn: (r) => r._field !~ /^police_/)
+            |> aggregateWindow(every: {window}s, fn: mean, createEmpty: false, timeSrc: "_start")
+        union(tables: [peaks, means])
             |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
             |> sort(columns: ["_time"])'''
-        result = client.query_api().query(query)
-        data = []
-        for table in result:
-            for record in table.records:
-                data.append({
-                    "timestamp": record.get_time().isoformat(),
-                    "people_count": record.values.get("people_count"),
-                    "street_count": record.values.get("street_count") or 0,
-                    "terrace_count": record.values.get("terrace_count") or 0,
-                    "party_level": record.values.get("party_level"),
-                    "car_count": record.values.get("car_count") or 0,
-                    "police_score": record.values.get("police_score") or 0,
-                    "police_cars": record.values.get("police_cars") or 0,
-                    "police_vans": record.values.get("police_vans") or 0,
-                    "police_uniformed": record.values.get("police_uniformed") or 0
-                })
-        data.sort(key=lambda x: x['timestamp'])
-        return data
+    else:
+        query = f'''{source}
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> sort(columns: ["_time"])'''
+    client = get_client()
+    result = client.query_api().query(query)
+    data = []
+    for table in result:
+        for record in table.records:
+            v = record.values
+            data.append({
+                "timestamp": record.get_time().isoformat(),
+                "people_count": _count(v.get("people_count")),
+                "street_count": _count(v.get("street_count")) or 0,
+                "terrace_count": _count(v.get("terrace_count")) or 0,
+                "party_level": _count(v.get("party_level")),
+                "car_count": _count(v.get("car_count")) or 0,
+                "police_score": v.get("police_score") or 0,
+                "police_cars": v.get("police_cars") or 0,
+                "police_vans": v.get("police_vans") or 0,
+                "police_uniformed": v.get("police_uniformed") or 0,
+                "carried_forward": bool(round(v.get("carried_forward") or 0))
+            })
+    data.sort(key=lambda x: x['timestamp'])
+    return data
+
+
+def _count(value):
+    """Window means come back as floats; counts are shown as whole numbers."""
+    return round(value) if isinstance(value, float) else value
 
 
-def get_restaurant_history(hours=24, categories=None):
+@cached('restaurant')
+def get_restaurant_history(hours=24, categories=None, max_points=None, since=None):
     """
     Get restaurant history aggregated by category.
     categories: list like ['placa_mercadal', 'top'] or None for plaza categories only
+    max_points: widen the 5 min window so each series stays under this many points
+    since: only windows from this timestamp on (see _range)
     """
     if categories is None:
         categories = ['placa_mercadal', 'placa_evarist_fabregas', 'placa_del_teatre']
     
     cat_filter = ' or '.join([f'r.category == "{c}"' for c in categories])
+    bucket, resolution = _tier(hours, 300)
+    window = _window_seconds(hours, max_points, resolution) or resolution
     
-    with get_client() as client:
-        query = f'''from(bucket: "{INFLUX_BUCKET}")
-            |> range(start: -{hours}h)
-            |> filter(fn: (r) => r._measurement == "restaurant" or r._measurement == "top_restaurant")
-            |> filter(fn: (r) => r._field == "busyness")
-            |> group(columns: ["category", "plaza"])
-            |> aggregateWindow(every: 5m, fn: mean, createEmpty: false)'''
-        result = client.query_api().query(query)
-        data = {}
-        for table in result:
-            for record in table.records:
-                # Support both old 'plaza' tag and new 'category' tag
-                key = record.values.get("category") or record.values.get("plaza")
-                if key and key in categories:
-                    if key not in data:
-                        data[key] = []
-                    data[key].append({
-                        "timestamp": record.get_time().isoformat(),
-                        "busyness": round(record.get_value() or 0)
-                    })
-        for key in data:
-            data[key].sort(key=lambda x: x['timestamp'])
-        return data
-
-
-def get_restaurant_history_by_name(hours=24, categories=None):
-    """Get restaurant history grouped by individual restaurant name."""
+    client = get_client()
+    query = f'''from(bucket: "{bucket}")
+        |> {_range(hours, since)}
+        |> filter(fn: (r) => r._measurement == "restaurant" or r._measurement == "top_restaurant")
+        |> filter(fn: (r) => r._field == "busyness")
+        |> group(columns: ["category", "plaza"])
+        |> aggregateWindow(every: {window}s, fn: mean, createEmpty: false, timeSrc: "_start")'''
+    result = client.query_api().query(query)
+    data = {}
+    for table in result:
+        for record in table.records:
+            # Support both old 'plaza' tag and new 'category' tag
+            key = record.values.get("category") or record.values.get("plaza")
+            if key and key in categories:
+                if key not in data:
+                    data[key] = []
+                data[key].append({
+                    "timestamp": record.get_time().isoformat(),
+                    "busyness": round(record.get_value() or 0)
+                })
+    for key in data:
+        data[key].sort(key=lambda x: x['timestamp'])
+    return data
+
+
+@cached('restaurant')
+def get_restaurant_history_by_name(hours=24, categories=None, max_points=None, since=None):
+    """Get restaurant history grouped by individual restaurant name. since: as in get_restaurant_history."""
     if categories is None:
         categories = ['top']
     
     cat_filter = ' or '.join([f'r.category == "{c}"' for c in categories])
+    bucket, resolution = _tier(hours, 300)
+    window = _window_seconds(hours, max_points, resolution) or resolution
     
-    with get_client() as client:
-        query = f'''from(bucket: "{INFLUX_BUCKET}")
-            |> range(start: -{hours}h)
-            |> filter(fn: (r) => r._measurement == "restaurant" or r._measurement == "top_restaurant")
-            |> filter(fn: (r) => r._field == "busyness")
-            |> filter(fn: (r) => {cat_filter})
-            |> group(columns: ["name"])
-            |> aggregateWindow(every: 5m, fn: mean, createEmpty: false)'''
-        result = client.query_api().query(query)
-        data = {}
-        for table in result:
-            for record in table.records:
-                name = record.values.get("name")
-                if name:
-                    if name not in data:
-                        data[name] = []
-                    data[name].append({
-                        "timestamp": record.get_time().isoformat(),
-                        "busyness": round(record.get_value() or 0)
-                    })
-        for name in data:
-            data[name].sort(key=lambda x: x['timestamp'])
-        return data
+    client = get_client()
+    query = f'''from(bucket: "{bucket}")
+        |> {_range(hours, since)}
+        |> filter(fn: (r) => r._measurement == "restaurant" or r._measurement == "top_restaurant")
+        |> filter(fn: (r) => r._field == "busyness")
+        |> filter(fn: (r) => {cat_filter})
+        |> group(columns: ["name"])
+        |> aggregateWindow(every: {window}s, fn: mean, createEmpty: false, timeSrc: "_start")'''
+    result = client.query_api().query(query)
+    data = {}
+    for table in result:
+        for record in table.records:
+            name = record.values.get("name")
+            if name:
+                if name not in data:
+                    data[name] = []
+                data[name].append({
+                    "timestamp": record.get_time().isoformat(),
+                    "busyness": round(record.get_value() or 0)
+                })
+    for name in data:
+        data[name].sort(key=lambda x: x['timestamp'])
+    return data
 
 
 # Backward compatibility aliases
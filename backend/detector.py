@@ -0,0 +1,83 @@
+"""
+Local CPU person/vehicle detector - YOLO ONNX model run in-process via OpenCV DNN
+"""
+import sys
+
+from config import ROIS, LOCAL_MODEL_PATH, LOCAL_MIN_SCORE
+
+INPUT_SIZE = 640
+PERSON = 0
+VEHICLES = {2, 3, 5, 7}  # COCO: car, motorcycle, bus, truck
+SURE_SCORE = 0.5  # Detections below this count as uncertain
+
+
+class LocalDetector:
+    """Loads the model once; detect() returns counts in analyze_image's shape plus a confidence."""
+
+    def __init__(self, model_path=LOCAL_MODEL_PATH):
+        # Optional dependencies, only needed for ANALYZER_BACKEND=local/hybrid
+        import cv2
+        import numpy as np
+        self.cv2, self.np = cv2, np
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+
+    def _detections(self, image_path):
+        """Run the model. Returns: [(class_id, score, (x, y, w, h))] in frame pixels after NMS, (w, h)"""
+        cv2, np = self.cv2, self.np
+        img = cv2.imread(image_path)
+        if img is None:
+            raise ValueError(f"unreadable image: {image_path}")
+        h, w = img.shape[:2]
+        # Letterbox to a square so boxes scale back uniformly
+        side = max(h, w)
+        square = np.zeros((side, side, 3), dtype=np.uint8)
+        square[:h, :w] = img
+        blob = cv2.dnn.blobFromImage(square, 1 / 255.0, (INPUT_SIZE, INPUT_SIZE), swapRB=True)
+        self.net.setInput(blob)
+        out = self.net.forward()[0].T  # (anchors, 4 + classes)
+        scale = side / INPUT_SIZE
+
+        boxes, scores, classes = [], [], []
+        for row in out:
+            class_scores = row[4:]
+            class_id = int(np.argmax(class_scores))
+            score = float(class_scores[class_id])
+            if score < LOCAL_MIN_SCORE or (class_id != PERSON and class_id not in VEHICLES):
+                continue
+            cx, cy, bw, bh = row[:4] * scale
+            boxes.append([int(cx - bw / 2), int(cy - bh / 2), int(bw), int(bh)])
+            scores.append(score)
+            classes.append(class_id)
+        keep = cv2.dnn.NMSBoxes(boxes, scores, LOCAL_MIN_SCORE, 0.45)
+        return [(classes[i], scores[i], boxes[i]) for i in np.array(keep).flatten()], (w, h)
+
+    def detect(self, image_path):
+        """Count people (split street/terrace by the terrace ROI) and vehicles."""
+        detections, (w, h) = self._detections(image_path)
+        terrace = ROIS.get('terrace')
+        street = terrace_count = cars = uncertain = 0
+        for class_id, score, (x, y, bw, bh) in detections:
+            if score < SURE_SCORE:
+                uncertain += 1
+            if class_id in VEHICLES:
+                cars += 1
+                continue
+            # Feet position decides the region; without a terrace ROI everyone is street
+            fx, fy = (x + bw / 2) / w, (y + bh) / h
+            if terrace and terrace[0] <= fx <= terrace[2] and terrace[1] <= fy <= terrace[3]:
+                terrace_count += 1
+            else:
+                street += 1
+        return {
+            "street": street,
+            "terrace": terrace_count,
+            "cars": cars,
+            "confidence": 1 - uncertain / len(detections) if detections else 1.0,
+        }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        print(LocalDetector().detect(sys.argv[1]))
+    else:
+        print("Usage: python detector.py <image_path>")
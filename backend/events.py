@@ -0,0 +1,175 @@
+"""
+Server-Sent Events: jobs publish small JSON deltas through a spool file shared by every
+worker process, and each process fans them out to its own open dashboards
+"""
+import os
+import json
+import time
+import fcntl
+import queue
+import threading
+from collections import deque
+
+from config import SSE_MAX_SUBSCRIBERS
+
+EVENTS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'events.log')
+KEEPALIVE_SECONDS = 15
+
+
+class EventBroker:
+    """
+    Fan-out to subscriber queues. A subscriber that stops reading (queue full) is dropped;
+    its browser reconnects with Last-Event-ID and replays what it missed from `recent`.
+    Each open stream holds a server thread, so at most max_subscribers are accepted.
+    """
+
+    def __init__(self, history=100, queue_size=100, max_subscribers=None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.rejected = 0
+        self._subscribers = set()
+        self._recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def publish(self, event, data, event_id=None):
+        with self._lock:
+            event_id = event_id or self._next_id
+            message = (event_id, f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n")
+            self._next_id = event_id + 1
+            self._recent.append(message)
+            for q in list(self._subscribers):
+                if q.qsize() >= self.queue_size:
+                    # The spare slot takes the stop marker; the stream ends after draining the backlog
+                    self._subscribers.discard(q)
+                    q.put_nowait(None)
+                else:
+                    q.put_nowait(message)
+
+    def subscribe(self, last_event_id=None):
+        """A queue of messages after last_event_id, or None when max_subscribers are already open."""
+        q = queue.Queue(self.queue_size + 1)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            if last_event_id is not None:
+                for message in self._recent:
+                    if message[0] > last_event_id:
+                        q.put_nowait(message)
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def stream(self, q):
+        """Generator of SSE text for one subscribed queue, with keepalive comments so proxies keep it open."""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = q.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message[1]
+        finally:
+            self.unsubscribe(q)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "max_subscribers": self.max_subscribers,
+                    "rejected": self.rejected, "last_id": self._next_id - 1}
+
+
+class EventBus:
+    """
+    Cross-process events. publish() appends a JSON line to the spool under an flock; every
+    process tails the spool and passes each event to its handlers and local broker.
+    Events named with a leading underscore are internal and never reach browsers.
+    Ids are publish times in ns, so Last-Event-ID means the same in every worker.
+    """
+
+    def __init__(self, path, broker, max_bytes=5 * 1024 * 1024, poll_seconds=0.5):
+        self.path = path
+        self.broker = broker
+        self.max_bytes = max_bytes
+        self.poll_seconds = poll_seconds
+        self._handlers = []
+        self._thread = None
+
+    def on(self, fn):
+        """fn(event, data) runs in the tail thread for every event, from any process."""
+        self._handlers.append(fn)
+
+    def publish(self, event, data):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            with open(self.path, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                # Rotated while we waited for the lock: append to the new file instead
+                try:
+                    if os.stat(self.path).st_ino != os.fstat(f.fileno()).st_ino:
+                        continue
+                except FileNotFoundError:
+                    continue
+                f.write(json.dumps({"id": time.time_ns(), "event": event, "data": data}) + "\n")
+                f.flush()
+                if f.tell() > self.max_bytes:
+                    os.replace(self.path, self.path + '.1')
+                return
+
+    def start(self):
+        """Tail from the current end of the spool (earlier events are not replayed)."""
+        if self._thread and self._thread.is_alive():
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, 'a+')
+        f.seek(0, os.SEEK_END)
+        self._thread = threading.Thread(target=self._run, args=(f,), name='event-bus', daemon=True)
+        self._thread.start()
+
+    def _run(self, f):
+        pending = ''
+        while True:
+            chunk = f.read()
+            if chunk:
+                pending += chunk
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    self._dispatch(line)
+                continue
+            try:
+                rotated = os.stat(self.path).st_ino != os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                rotated = False
+            if rotated:
+                # Old file fully read (EOF above), the new one is read from its start
+                f.close()
+                f = open(self.path, 'a+')
+                f.seek(0)
+                pending = ''
+                continue
+            time.sleep(self.poll_seconds)
+
+    def _dispatch(self, line):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return
+        event, data = message["event"], message["data"]
+        for fn in self._handlers:
+            try:
+                fn(event, data)
+            except Exception as e:
+                print(f"[ERROR] event handler for {event}: {e}", flush=True)
+        if not event.startswith('_'):
+            self.broker.publish(event, data, message["id"])
+
+
+broker = EventBroker(max_subscribers=SSE_MAX_SUBSCRIBERS)
+bus = EventBus(EVENTS_FILE, broker)
@@ -0,0 +1,31 @@
+"""
+Cheap frame change detection, used to skip AI analysis of unchanged frames
+"""
+from PIL import Image, ImageChops, ImageFilter
+
+SIGNATURE_SIZE = (160, 90)
+PIXEL_DELTA = 25  # Grey levels a pixel must move to count as changed (stream noise is below this)
+
+
+def frame_signature(image_path):
+    """Downscaled, blurred greyscale copy of a frame for comparison."""
+    with Image.open(image_path) as img:
+        small = img.convert('L').resize(SIGNATURE_SIZE, Image.BILINEAR)
+    return small.filter(ImageFilter.GaussianBlur(1))
+
+
+def frame_difference(a, b):
+    """Fraction of signature pixels that changed noticeably between two frames (0.0-1.0)."""
+    diff = ImageChops.difference(a, b)
+    hist = diff.histogram()
+    changed = sum(hist[PIXEL_DELTA:])
+    return changed / (SIGNATURE_SIZE[0] * SIGNATURE_SIZE[1])
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) == 3:
+        score = frame_difference(frame_signature(sys.argv[1]), frame_signature(sys.argv[2]))
+        print(f"Change score: {score:.4f}")
+    else:
+        print("Usage: python frame_diff.py <image_a> <image_b>")
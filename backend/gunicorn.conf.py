@@ -0,0 +1,15 @@
+"""
+gunicorn settings, see the README's production section
+"""
+from config import PORT, WEB_WORKERS, WEB_THREADS
+
+bind = f"0.0.0.0:{PORT}"
+workers = WEB_WORKERS
+# Threads, not async workers: capture is thread-bound. SSE streams hold a thread each, which
+# events.broker caps at SSE_MAX_SUBSCRIBERS so the rest stay free for the API
+worker_class = 'gthread'
+threads = WEB_THREADS
+# Each worker imports the app itself, so the scheduler lock and threads are per-process
+preload_app = False
+# gthread workers heartbeat from their main loop, so long-lived SSE streams don't trip the timeout
+graceful_timeout = 10
@@ -0,0 +1,54 @@
+"""
+Elects one process (of several WSGI workers) through an exclusive flock on a shared file
+"""
+import os
+import fcntl
+import threading
+import time
+
+
+class LeaderLock:
+    """
+    The first process to lock `path` becomes leader and runs on_acquire() once. The kernel drops
+    the lock when that process dies, so the others keep retrying and one of them takes over.
+    """
+
+    def __init__(self, path, on_acquire, retry_seconds=10):
+        self.path = path
+        self.on_acquire = on_acquire
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self._fd = None
+        self._thread = None
+
+    def try_acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        # Held for the life of the process; the pid is only there for humans
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        self.is_leader = True
+        return True
+
+    def start(self):
+        """Try now, then keep retrying in the background until this process leads."""
+        if self.try_acquire():
+            self._lead()
+            return
+        self._thread = threading.Thread(target=self._wait, name='leader-election', daemon=True)
+        self._thread.start()
+
+    def _wait(self):
+        while not self.try_acquire():
+            time.sleep(self.retry_seconds)
+        self._lead()
+
+    def _lead(self):
+        print(f"[leader] pid {os.getpid()} owns the scheduler", flush=True)
+        self.on_acquire()
@@ -0,0 +1,47 @@
+"""
+Memoized value rebuilt on demand after an invalidate() or once its TTL runs out
+"""
+import threading
+import time
+
+
+class Memo:
+    """
+    Caches build()'s result. Concurrent misses wait for a single build instead of
+    each running it. A build that was invalidated while running is returned but not kept.
+    """
+
+    def __init__(self, build, ttl):
+        self._build = build
+        self.ttl = ttl
+        self._value = None
+        self._expires = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        with self._build_lock:
+            with self._lock:
+                if self._value is not None and time.monotonic() < self._expires:
+                    self.hits += 1
+                    return self._value
+                generation = self._generation
+                self.misses += 1
+            value = self._build()
+            with self._lock:
+                if generation == self._generation:
+                    self._value = value
+                    self._expires = time.monotonic() + self.ttl
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._value = None
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": self._value is not None}
@@ -0,0 +1,152 @@
+"""
+Staged frame pipeline: capture -> analysis -> persistence, each with its own bounded queue
+"""
+import threading
+import time
+from collections import deque
+
+POLICIES = ('drop_oldest', 'keep_latest', 'every_nth', 'block')
+
+
+class Stage:
+    """
+    A worker thread consuming a bounded queue. fn(item) returns the item for
+    the next stage, or None to end the chain there.
+    When the queue is full, policy decides what gives:
+      drop_oldest - discard the oldest queued item
+      keep_latest - discard everything queued, only the newest item waits
+      every_nth   - accept every Nth offered item, then behave like drop_oldest
+      block       - make the producer wait (nothing is lost)
+    Keys listed in `carry` (e.g. a refresh job riding on a frame) survive drops: a dropped
+    item's values move onto the next item this stage accepts, unless it has its own.
+    """
+
+    def __init__(self, name, fn, maxsize=1, policy='drop_oldest', every_nth=1, carry=()):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown backpressure policy: {policy}")
+        self.name = name
+        self.fn = fn
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.every_nth = max(1, every_nth)
+        self.carry = carry
+        self._carried = {}
+        self.next = None
+        self.on_error = None
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._offered = 0
+        self._busy_since = None
+        self._done_times = deque(maxlen=100)
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_duration = None
+        self.last_lag = None  # Seconds from first enqueue (frame age) to finishing this stage
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=f'stage-{self.name}', daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        """Offer an item, applying the backpressure policy. Returns False if it was dropped."""
+        item.setdefault("enqueued_at", time.monotonic())
+        with self._cond:
+            self._offered += 1
+            if self.policy == 'every_nth' and (self._offered - 1) % self.every_nth:
+                self._drop(item)
+                return False
+            if self.policy == 'keep_latest':
+                while self._items:
+                    self._drop(self._items.popleft())
+            elif self.policy == 'block':
+                while len(self._items) >= self.maxsize:
+                    self._cond.wait()
+            elif len(self._items) >= self.maxsize:
+                self._drop(self._items.popleft())
+            for key, value in self._carried.items():
+                if item.get(key) is None:
+                    item[key] = value
+            self._carried = {}
+            self._items.append(item)
+            self.received += 1
+            self._cond.notify_all()
+        return True
+
+    def _drop(self, item):
+        """Count a dropped item and keep its carry values for the next accepted one (lock held)."""
+        self.dropped += 1
+        for key in self.carry:
+            if item.get(key) is not None:
+                self._carried[key] = item[key]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                item = self._items.popleft()
+                self._busy_since = time.monotonic()
+                self._cond.notify_all()
+            try:
+                out = self.fn(item)
+            except Exception as e:
+                out = None
+                self.errors += 1
+                print(f"[pipeline] {self.name} failed: {e}", flush=True)
+                if self.on_error:
+                    self.on_error(self.name, item, e)
+            now = time.monotonic()
+            with self._cond:
+                self.last_duration = now - self._busy_since
+                self.last_lag = now - item["enqueued_at"]
+                self._busy_since = None
+                self.processed += 1
+                self._done_times.append(now)
+            if out is not None and self.next:
+                self.next.put(out)
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            window = [t for t in self._done_times if now - t <= 3600]
+            oldest = self._items[0]["enqueued_at"] if self._items else None
+            return {
+                "policy": self.policy,
+                "queue_depth": len(self._items),
+                "maxsize": self.maxsize,
+                "busy": self._busy_since is not None,
+                "received": self.received,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "per_hour": len(window),
+                "last_duration_s": round(self.last_duration, 2) if self.last_duration is not None else None,
+                "last_lag_s": round(self.last_lag, 2) if self.last_lag is not None else None,
+                "oldest_queued_s": round(now - oldest, 2) if oldest is not None else None,
+            }
+
+
+class Pipeline:
+    """Chains stages so each one's output feeds the next stage's queue."""
+
+    def __init__(self, stages, on_error=None):
+        self.stages = stages
+        for stage, nxt in zip(stages, stages[1:] + [None]):
+            stage.next = nxt
+            stage.on_error = on_error
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, item=None):
+        """Feed the first stage."""
+        return self.stages[0].put(item if item is not None else {})
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
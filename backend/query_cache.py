@@ -0,0 +1,100 @@
+"""
+In-memory LRU of query results, tagged by measurement and invalidated when that measurement is written
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class _Flight:
+    """A load in progress; identical misses wait on it instead of querying again."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class QueryCache:
+    """
+    Size-bounded LRU with a TTL safety net. Values are shared between callers, treat them as read-only.
+    A load that was invalidated while running is returned to its callers but not stored.
+    """
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires, tag, value)
+        self._inflight = {}
+        self._generations = defaultdict(int)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def get(self, key, tag, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                generation = self._generations[tag]
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = load()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if flight.error is None and generation == self._generations[tag]:
+                    self._entries[key] = (time.monotonic() + self.ttl, tag, flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, tag, notify=True):
+        """Drop every result built from `tag` data, then tell listeners (e.g. response memos, other processes)."""
+        with self._lock:
+            self._generations[tag] += 1
+            for key in [k for k, entry in self._entries.items() if entry[1] == tag]:
+                del self._entries[key]
+            self.invalidations += 1
+            listeners = list(self._listeners) if notify else []
+        for listener in listeners:
+            listener(tag)
+
+    def add_listener(self, fn):
+        """fn(tag) is called after each invalidation."""
+        with self._lock:
+            self._listeners.append(fn)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+            }
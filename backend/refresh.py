@@ -0,0 +1,85 @@
+"""
+Forced refresh jobs, shared by every worker through a small JSON file updated under an flock
+"""
+import os
+import json
+import time
+import uuid
+import fcntl
+from contextlib import contextmanager
+
+JOBS_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'refresh_jobs.json')
+ACTIVE = ('queued', 'running')
+
+
+class RefreshJobs:
+    """
+    At most one job is active: requests while one is queued or running join it. The scheduler
+    process claims the queued job for the next frame it captures and reports each stage.
+    A job that stays active past `timeout` (e.g. the scheduler died with it) is marked failed.
+    """
+
+    def __init__(self, path, min_interval=60, timeout=600, keep=20):
+        self.path = path
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.keep = keep
+
+    @contextmanager
+    def _jobs(self):
+        """Locked read-modify-write of the job list (newest last)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                jobs = json.loads(f.read() or '[]')
+            except ValueError:
+                jobs = []
+            now = time.time()
+            for job in jobs:
+                if job["status"] in ACTIVE and now - job["requested_at"] > self.timeout:
+                    job.update({"status": "failed", "error": "timed out", "finished_at": now})
+            yield jobs
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(jobs[-self.keep:]))
+
+    def request(self):
+        """
+        Returns (job, None): the active job (joined) or a new one. Returns (None, retry_after_seconds)
+        if there is none and the last job was requested less than min_interval ago.
+        """
+        with self._jobs() as jobs:
+            for job in jobs:
+                if job["status"] in ACTIVE:
+                    job["requests"] += 1
+                    return job, None
+            now = time.time()
+            if jobs and now - jobs[-1]["requested_at"] < self.min_interval:
+                return None, int(self.min_interval - (now - jobs[-1]["requested_at"])) + 1
+            job = {"id": uuid.uuid4().hex[:12], "status": "queued", "stage": None, "requests": 1,
+                   "requested_at": now, "started_at": None, "finished_at": None, "result": None, "error": None}
+            jobs.append(job)
+            return job, None
+
+    def get(self, job_id):
+        with self._jobs() as jobs:
+            return next((job for job in jobs if job["id"] == job_id), None)
+
+    def claim(self):
+        """Mark the queued job (if any) as running on the frame being captured; returns its id."""
+        with self._jobs() as jobs:
+            for job in jobs:
+                if job["status"] == 'queued':
+                    job.update({"status": "running", "stage": "capture", "started_at": time.time()})
+                    return job["id"]
+        return None
+
+    def update(self, job_id, **fields):
+        with self._jobs() as jobs:
+            for job in jobs:
+                if job["id"] == job_id:
+                    if fields.get("status") in ('done', 'failed'):
+                        fields["finished_at"] = time.time()
+                    job.update(fields)
@@ -0,0 +1,104 @@
+"""
+Tiered screenshot retention, run daily:
+  newer than RETENTION_FULL_DAYS     - PNG and variants on disk, untouched
+  older                              - packed into screenshots/archive/YYYYMMDD.zip (WebP full + thumb)
+  older than RETENTION_ARCHIVE_DAYS  - the day archive keeps only police sighting and party peak frames
+
+    python retention.py
+"""
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from config import RETENTION_FULL_DAYS, RETENTION_ARCHIVE_DAYS, RETENTION_PEAKS_PER_DAY
+from archive import archive_dir, archive_path, archived_frames, is_pruned, rewrite_archive
+from variants import SIZES as VARIANT_SIZES, get_variant, remove_variants
+from database import get_party_peaks
+import sightings
+
+
+def _cutoff(days):
+    """Days before this YYYYMMDD are past the tier."""
+    return (datetime.now() - timedelta(days=days)).strftime('%Y%m%d')
+
+
+def keep_frames(day, catalog):
+    """Frames of a day worth keeping forever: police sightings and the day's highest people counts."""
+    start = datetime.strptime(day, '%Y%m%d').astimezone()
+    stop = start + timedelta(days=1)
+    keep = sightings.screenshots_between(start, stop)
+    for t in get_party_peaks(start.astimezone(timezone.utc), stop.astimezone(timezone.utc), RETENTION_PEAKS_PER_DAY):
+        name = catalog.at_or_before(t)
+        if name and name[6:14] == day:
+            keep.add(name)
+    return keep
+
+
+def pack_day(catalog, names, keep=None):
+    """Move a day's PNG frames into its archive as variants. keep: frames to retain (None = all)."""
+    files = []
+    for name in names:
+        if keep is None or name in keep:
+            for size in VARIANT_SIZES:
+                path, _ = get_variant(catalog.path(name), size)
+                files.append((os.path.basename(path), path))
+    rewrite_archive(archive_path(catalog.directory, names[0]), files, pruned=keep is not None)
+    # Only delete once the archive is in place, so every frame stays readable throughout
+    for name in names:
+        remove_variants(catalog.path(name))
+        os.remove(catalog.path(name))
+        if keep is not None and name not in keep:
+            catalog.remove(name)
+
+
+def prune_day(catalog, path, keep):
+    """Drop every archived frame of a day that is not in keep."""
+    dropped = archived_frames(path) - keep
+    rewrite_archive(path, keep=keep, pruned=True)
+    for name in dropped:
+        catalog.remove(name)
+    return len(dropped)
+
+
+def run_retention(catalog):
+    """Scheduler job: pack frames past the full-resolution tier, prune archives past the archive tier."""
+    if not RETENTION_FULL_DAYS:
+        return
+    full_cutoff = _cutoff(RETENTION_FULL_DAYS)
+    archive_cutoff = _cutoff(RETENTION_ARCHIVE_DAYS) if RETENTION_ARCHIVE_DAYS else None
+
+    days = defaultdict(list)
+    for entry in os.scandir(catalog.directory):
+        name = entry.name
+        if name.startswith('frame_') and name.endswith('.png') and name[6:14] < full_cutoff:
+            days[name[6:14]].append(name)
+    for day, names in sorted(days.items()):
+        try:
+            keep = keep_frames(day, catalog) if archive_cutoff and day < archive_cutoff else None
+            pack_day(catalog, sorted(names), keep)
+            print(f"[retention] Packed {len(names)} frames of {day}", flush=True)
+        except Exception as e:
+            print(f"[ERROR] retention pack {day}: {e}", flush=True)
+
+    if not archive_cutoff or not os.path.isdir(archive_dir(catalog.directory)):
+        return
+    for entry in sorted(os.scandir(archive_dir(catalog.directory)), key=lambda e: e.name):
+        day = entry.name[:8]
+        if not entry.name.endswith('.zip') or day >= archive_cutoff:
+            continue
+        try:
+            if is_pruned(entry.path):
+                continue
+            dropped = prune_day(catalog, entry.path, keep_frames(day, catalog))
+            print(f"[retention] Pruned {dropped} frames of {day}", flush=True)
+        except Exception as e:
+            print(f"[ERROR] retention prune {day}: {e}", flush=True)
+
+
+if __name__ == '__main__':
+    from catalog import ScreenshotCatalog
+    catalog = ScreenshotCatalog(os.path.join(os.path.dirname(__file__), '..', 'screenshots'))
+    catalog.rebuild()
+    run_retention(catalog)
+    sys.exit(0)
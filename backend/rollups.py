@@ -0,0 +1,113 @@
+"""
+Hourly and daily rollups of party and restaurant data, written server-side by Flux into their own buckets.
+
+    python rollups.py --rebuild --days 400
+"""
+import sys
+import argparse
+from datetime import datetime, timedelta, timezone
+from influxdb_client.domain.bucket_retention_rules import BucketRetentionRules
+
+from config import ROLLUP_HOURLY_RETENTION_DAYS, ROLLUP_DAILY_RETENTION_DAYS
+from database import get_client, query_cache, INFLUX_BUCKET, INFLUX_ORG, HOURLY_BUCKET, DAILY_BUCKET
+
+# name: (source bucket, target bucket, window, retention days)
+ROLLUPS = {
+    "hourly": (INFLUX_BUCKET, HOURLY_BUCKET, "1h", ROLLUP_HOURLY_RETENTION_DAYS),
+    "daily": (HOURLY_BUCKET, DAILY_BUCKET, "1d", ROLLUP_DAILY_RETENTION_DAYS),
+}
+
+
+def ensure_buckets():
+    """Create missing rollup buckets. Returns names of rollups whose bucket was just created."""
+    buckets_api = get_client().buckets_api()
+    created = []
+    for name, (_, target, _, retention_days) in ROLLUPS.items():
+        if buckets_api.find_bucket_by_name(target):
+            continue
+        rules = BucketRetentionRules(type="expire", every_seconds=retention_days * 86400) if retention_days else None
+        buckets_api.create_bucket(bucket_name=target, retention_rules=rules, org=INFLUX_ORG)
+        print(f"[rollup] Created bucket {target}", flush=True)
+        created.append(name)
+    return created
+
+
+def rollup(name, start, stop):
+    """Aggregate [start, stop) into the rollup bucket. Idempotent: windows are overwritten."""
+    source, target, window, _ = ROLLUPS[name]
+    # Callers pass local (aware or naive) times as well as UTC ones
+    start, stop = start.astimezone(timezone.utc), stop.astimezone(timezone.utc)
+    span = f'range(start: {start.strftime("%Y-%m-%dT%H:%M:%SZ")}, stop: {stop.strftime("%Y-%m-%dT%H:%M:%SZ")})'
+    # Counts are averaged, police fields keep the window max so sightings survive
+    query = f'''party = from(bucket: "{source}")
+        |> {span}
+        |> filter(fn: (r) => r._measurement == "party")
+    party
+        |> filter(fn: (r) => r._field =~ /^police_/)
+        |> aggregateWindow(every: {window}, fn: max, createEmpty: false, timeSrc: "_start")
+        |> to(bucket: "{target}", org: "{INFLUX_ORG}")
+    party
+        |> filter(fn: (r) => r._field !~ /^police_/)
+        |> aggregateWindow(every: {window}, fn: mean, createEmpty: false, timeSrc: "_start")
+        |> to(bucket: "{target}", org: "{INFLUX_ORG}")
+    from(bucket: "{source}")
+        |> {span}
+        |> filter(fn: (r) => r._measurement == "restaurant" or r._measurement == "top_restaurant")
+        |> filter(fn: (r) => r._field == "busyness")
+        |> aggregateWindow(every: {window}, fn: mean, createEmpty: false, timeSrc: "_start")
+        |> to(bucket: "{target}", org: "{INFLUX_ORG}")'''
+    get_client().query_api().query(query)
+    # Long ranges read the rollup buckets
+    query_cache.invalidate('party')
+    query_cache.invalidate('restaurant')
+
+
+def _floor(now, name):
+    now = now.replace(minute=0, second=0, microsecond=0)
+    return now.replace(hour=0) if name == "daily" else now
+
+
+def rollup_recent(name):
+    """Scheduler job: re-aggregate the last few complete windows (covers late or backfilled points)."""
+    stop = _floor(datetime.now(timezone.utc), name)
+    start = stop - (timedelta(days=3) if name == "daily" else timedelta(hours=3))
+    try:
+        rollup(name, start, stop)
+        print(f"[rollup] {name} {start.isoformat()} -> {stop.isoformat()}", flush=True)
+    except Exception as e:
+        print(f"[ERROR] rollup {name}: {e}", flush=True)
+
+
+def rebuild(name, days):
+    """Aggregate the last `days` of history in weekly chunks."""
+    stop = _floor(datetime.now(timezone.utc), name)
+    start = stop - timedelta(days=days)
+    while start < stop:
+        chunk_stop = min(start + timedelta(days=7), stop)
+        rollup(name, start, chunk_stop)
+        start = chunk_stop
+    print(f"[rollup] Rebuilt {name} for the last {days} days", flush=True)
+
+
+def init_rollups(days=400):
+    """Startup: create buckets, and fill any new one from existing history (hourly before daily)."""
+    try:
+        for name in ensure_buckets():
+            rebuild(name, days)
+    except Exception as e:
+        print(f"[ERROR] rollup init: {e}", flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain hourly/daily rollup buckets")
+    parser.add_argument('--rebuild', action='store_true', help="re-aggregate history into every tier")
+    parser.add_argument('--days', type=int, default=400, help="how far back to rebuild")
+    args = parser.parse_args()
+    ensure_buckets()
+    if args.rebuild:
+        for name in ROLLUPS:
+            rebuild(name, args.days)
+    else:
+        for name in ROLLUPS:
+            rollup_recent(name)
+    sys.exit(0)
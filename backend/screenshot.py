@@ -1,85 +1,312 @@
 import os
 import json
+import queue
+import threading
+import time
 from datetime import datetime
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
+from config import CAPTURE_QUALITY, READY_TIMEOUT_MS
 
 SCREENSHOTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'screenshots')
 COOKIES_FILE = os.path.join(os.path.dirname(__file__), '..', 'youtube_cookies.json')
 
-def capture_youtube_frame(url):
-    """Capture screenshot from YouTube live stream - fullscreen, playing."""
+
+def _load_cookies(context):
+    """Load exported YouTube cookies into a browser context."""
+    if not os.path.exists(COOKIES_FILE):
+        return
+    with open(COOKIES_FILE) as f:
+        raw_cookies = json.load(f)
+    cookies = []
+    for c in raw_cookies:
+        cookie = {
+            'name': c['name'],
+            'value': c['value'],
+            'domain': c['domain'],
+            'path': c['path'],
+            'secure': c.get('secure', False),
+            'httpOnly': c.get('httpOnly', False),
+        }
+        if c.get('expirationDate'):
+            cookie['expires'] = int(c['expirationDate'])
+        ss = c.get('sameSite', '').lower()
+        if ss in ('strict', 'lax', 'none'):
+            cookie['sameSite'] = ss.capitalize()
+        cookies.append(cookie)
+    context.add_cookies(cookies)
+
+
+# Player state probes evaluated in the page
+VIDEO_HAS_FRAME = """() => {
+    const v = document.querySelector('video');
+    return !!v && v.readyState >= 2 && v.videoWidth > 0 && !v.paused && v.currentTime > 0;
+}"""
+QUALITY_IS = """(q) => {
+    const p = document.getElementById('movie_player');
+    return !!p && p.getPlaybackQuality && p.getPlaybackQuality() === q;
+}"""
+SET_QUALITY = """(q) => {
+    const p = document.getElementById('movie_player');
+    if (!p || !p.setPlaybackQualityRange) return false;
+    p.setPlaybackQualityRange(q, q);
+    return true;
+}"""
+CONTROLS_HIDDEN = """() => {
+    const p = document.getElementById('movie_player');
+    return !!p && p.classList.contains('ytp-autohide');
+}"""
+IS_FULLSCREEN = """() => {
+    const p = document.getElementById('movie_player');
+    return !!document.fullscreenElement || (!!p && p.classList.contains('ytp-fullscreen'));
+}"""
+
+
+class _StageTimer:
+    """Record wall time per capture stage in ms."""
+
+    def __init__(self):
+        self.timings = {}
+        self._t = time.monotonic()
+
+    def mark(self, stage):
+        now = time.monotonic()
+        self.timings[stage] = round((now - self._t) * 1000)
+        self._t = now
+
+
+def _wait(page, expression, arg=None, timeout=READY_TIMEOUT_MS):
+    """Wait for a page predicate. Returns False on timeout instead of raising."""
+    try:
+        page.wait_for_function(expression, arg=arg, timeout=timeout)
+        return True
+    except PlaywrightTimeoutError:
+        return False
+
+
+def _ensure_playing(page):
+    """Start playback if needed and wait until the video has a current frame."""
+    if page.evaluate(VIDEO_HAS_FRAME):
+        return
+    try:
+        page.click('button.ytp-large-play-button', timeout=2000)
+    except PlaywrightTimeoutError:
+        page.evaluate("() => { const v = document.querySelector('video'); if (v) v.play(); }")
+    if not _wait(page, VIDEO_HAS_FRAME):
+        raise RuntimeError(f"video has no frame after {READY_TIMEOUT_MS}ms")
+
+
+def _ensure_quality(page):
+    """Select CAPTURE_QUALITY via the player API, falling back to the settings menu."""
+    if page.evaluate(QUALITY_IS, CAPTURE_QUALITY):
+        return
+    if not page.evaluate(SET_QUALITY, CAPTURE_QUALITY):
+        try:
+            page.click('button.ytp-settings-button', timeout=2000)
+            page.click('text=Quality', timeout=2000)
+            page.click(f'text={CAPTURE_QUALITY.replace("hd", "")}p', timeout=2000)
+        except PlaywrightTimeoutError:
+            print(f"[capture] Quality menu unavailable", flush=True)
+    if not _wait(page, QUALITY_IS, CAPTURE_QUALITY):
+        print(f"[capture] Quality {CAPTURE_QUALITY} not active after {READY_TIMEOUT_MS}ms", flush=True)
+
+
+def _ensure_fullscreen(page):
+    if page.evaluate(IS_FULLSCREEN):
+        return
+    try:
+        page.click('button.ytp-fullscreen-button', timeout=2000)
+    except PlaywrightTimeoutError:
+        print(f"[capture] Fullscreen button unavailable", flush=True)
+        return
+    if not _wait(page, IS_FULLSCREEN, timeout=2000):
+        print(f"[capture] Fullscreen not confirmed", flush=True)
+
+
+def _hide_controls(page):
+    """Move mouse away and wait for the player to auto-hide its controls."""
+    page.mouse.move(0, 0)
+    if not _wait(page, CONTROLS_HIDDEN):
+        print(f"[capture] Controls still visible after {READY_TIMEOUT_MS}ms", flush=True)
+
+
+def _open_player(context, url, timer):
+    """Open the stream in a new page - fullscreen, playing, 720p."""
+    page = context.new_page()
+    # Visit youtube.com first to establish cookies
+    page.goto('https://www.youtube.com', timeout=60000, wait_until='domcontentloaded')
+    timer.mark('home')
+    page.goto(url, timeout=60000, wait_until='domcontentloaded')
+    page.wait_for_selector('video', state='attached', timeout=READY_TIMEOUT_MS)
+    timer.mark('load')
+    _ensure_playing(page)
+    timer.mark('play')
+    _ensure_quality(page)
+    timer.mark('quality')
+    _ensure_fullscreen(page)
+    timer.mark('fullscreen')
+    return page
+
+
+def _screenshot_when_ready(page, output_path, timer):
+    """Wait for a live frame with hidden controls, then screenshot."""
+    _ensure_playing(page)
+    timer.mark('ready')
+    _hide_controls(page)
+    timer.mark('controls')
+    page.screenshot(path=output_path)
+    timer.mark('screenshot')
+
+
+def frame_time(filename):
+    """Capture time from a frame filename (frame_20260129_121152.png), as an aware local datetime."""
+    stamp = os.path.basename(filename)[6:21]
+    return datetime.strptime(stamp, '%Y%m%d_%H%M%S').astimezone()
+
+
+def _frame_path():
     os.makedirs(SCREENSHOTS_DIR, exist_ok=True)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_path = os.path.join(SCREENSHOTS_DIR, f'frame_{timestamp}.png')
-    
+    return os.path.join(SCREENSHOTS_DIR, f'frame_{timestamp}.png')
+
+
+def capture_youtube_frame(url):
+    """
+    Capture screenshot from YouTube live stream - fullscreen, playing.
+    Returns: image path, {stage: ms}
+    """
+    output_path = _frame_path()
+    timer = _StageTimer()
+
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         context = browser.new_context(viewport={'width': 1280, 'height': 720})
-        
-        # Load cookies
-        if os.path.exists(COOKIES_FILE):
-            with open(COOKIES_FILE) as f:
-                raw_cookies = json.load(f)
-            cookies = []
-            for c in raw_cookies:
-                cookie = {
-                    'name': c['name'],
-                    'value': c['value'],
-                    'domain': c['domain'],
-                    'path': c['path'],
-                    'secure': c.get('secure', False),
-                    'httpOnly': c.get('httpOnly', False),
-                }
-                if c.get('expirationDate'):
-                    cookie['expires'] = int(c['expirationDate'])
-                ss = c.get('sameSite', '').lower()
-                if ss in ('strict', 'lax', 'none'):
-                    cookie['sameSite'] = ss.capitalize()
-                cookies.append(cookie)
-            context.add_cookies(cookies)
-        
-        page = context.new_page()
-        # Visit youtube.com first to establish cookies
-        page.goto('https://www.youtube.com', timeout=60000)
-        page.wait_for_timeout(2000)
-        page.goto(url, timeout=60000)
-        page.wait_for_timeout(3000)
-        
-        # Click play button if visible
-        try:
-            page.click('button.ytp-large-play-button', timeout=3000)
-            page.wait_for_timeout(2000)
-        except:
-            pass
-        
-        # Set quality to 720p
+        _load_cookies(context)
+        timer.mark('launch')
+        page = _open_player(context, url, timer)
+        _screenshot_when_ready(page, output_path, timer)
+        browser.close()
+
+    return output_path, timer.timings
+
+
+class CaptureSession:
+    """
+    Long-lived browser with the stream page kept open and playing.
+    Playwright's sync API is bound to the thread that started it, so the
+    browser lives on a dedicated thread and capture() hands requests to it.
+    """
+
+    def __init__(self, url, relaunch_after=0):
+        self.url = url
+        self.relaunch_after = relaunch_after  # Recycle browser after N captures (0 = never)
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._page = None
+        self._captures = 0
+        self.launches = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='capture-session', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread and self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join(timeout=30)
+
+    def capture(self, timeout=180):
+        """Take a frame from the warm page. Returns: image path, {stage: ms}"""
+        self.start()
+        done = threading.Event()
+        job = {"done": done, "path": None, "timings": None, "error": None}
+        self._requests.put(job)
+        if not done.wait(timeout):
+            raise TimeoutError(f"capture timed out after {timeout}s")
+        if job["error"]:
+            raise job["error"]
+        return job["path"], job["timings"]
+
+    def _run(self):
+        self._playwright = sync_playwright().start()
         try:
-            page.click('button.ytp-settings-button', timeout=2000)
-            page.wait_for_timeout(500)
-            page.click('text=Quality', timeout=2000)
-            page.wait_for_timeout(500)
-            page.click('text=720p', timeout=2000)
-            page.wait_for_timeout(1000)
-        except:
-            pass
-        
-        # Click fullscreen
+            while True:
+                job = self._requests.get()
+                if job is None:
+                    break
+                try:
+                    job["path"], job["timings"] = self._capture()
+                except Exception as e:
+                    job["error"] = e
+                    self._close_browser()
+                job["done"].set()
+        finally:
+            self._close_browser()
+            self._playwright.stop()
+            self._playwright = None
+
+    def _capture(self):
+        timer = _StageTimer()
+        if self.relaunch_after and self._captures >= self.relaunch_after:
+            print(f"[capture] Recycling browser after {self._captures} captures", flush=True)
+            self._close_browser()
+        alive = self._is_alive()
+        timer.mark('probe')
+        if not alive:
+            self._launch(timer)
+        output_path = _frame_path()
+        _screenshot_when_ready(self._page, output_path, timer)
+        self._captures += 1
+        return output_path, timer.timings
+
+    def _is_alive(self):
+        """Check the browser is connected and the player is still playing."""
+        if not self._browser or not self._browser.is_connected() or not self._page or self._page.is_closed():
+            return False
         try:
-            page.click('button.ytp-fullscreen-button', timeout=2000)
-            page.wait_for_timeout(1000)
-        except:
-            pass
-        
-        # Move mouse away to hide controls
-        page.mouse.move(0, 0)
-        page.wait_for_timeout(2000)
-        
-        page.screenshot(path=output_path)
-        browser.close()
-    
-    return output_path
+            state = self._page.evaluate("""() => {
+                const v = document.querySelector('video');
+                if (!v) return 'missing';
+                if (v.ended || v.error) return 'dead';
+                if (v.paused) { v.play(); }
+                return 'ok';
+            }""")
+        except Exception as e:
+            print(f"[capture] Page unresponsive: {e}", flush=True)
+            return False
+        if state != 'ok':
+            print(f"[capture] Player {state}, relaunching", flush=True)
+            return False
+        return True
+
+    def _launch(self, timer):
+        self._close_browser()
+        self._browser = self._playwright.chromium.launch(headless=True)
+        context = self._browser.new_context(viewport={'width': 1280, 'height': 720})
+        _load_cookies(context)
+        timer.mark('launch')
+        self._page = _open_player(context, self.url, timer)
+        self._captures = 0
+        self.launches += 1
+        print(f"[capture] Browser launched (#{self.launches})", flush=True)
+
+    def _close_browser(self):
+        if self._browser:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+        self._browser = None
+        self._page = None
+
 
 if __name__ == '__main__':
     from config import YOUTUBE_URL
-    path = capture_youtube_frame(YOUTUBE_URL)
-    print(f"Captured: {path}")
+    path, timings = capture_youtube_frame(YOUTUBE_URL)
+    print(f"Captured: {path} {timings}")
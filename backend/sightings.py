@@ -0,0 +1,180 @@
+"""
+Police sightings index - recorded when a frame is persisted (or backfilled), grouped into incidents, paged by cursor
+"""
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+from config import INCIDENT_GAP_SECONDS
+
+DB_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'police_sightings.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    frames INTEGER NOT NULL,
+    max_score INTEGER NOT NULL,
+    screenshot TEXT
+);
+CREATE TABLE IF NOT EXISTS sightings (
+    timestamp TEXT PRIMARY KEY,
+    screenshot TEXT,
+    people_count INTEGER NOT NULL,
+    police_score INTEGER NOT NULL,
+    police_cars INTEGER NOT NULL,
+    police_vans INTEGER NOT NULL,
+    police_uniformed INTEGER NOT NULL,
+    incident_id INTEGER NOT NULL REFERENCES incidents(id)
+);
+CREATE INDEX IF NOT EXISTS incidents_start ON incidents(start);
+"""
+
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, timeout=10)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _initialized = True
+    return conn
+
+
+def _utc(ts):
+    """Normalize to a UTC ISO string so timestamps sort as text."""
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return ts.astimezone(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def record_sighting(timestamp, screenshot, people_count, police_score, police_cars, police_vans, police_uniformed):
+    """Add a sighting, extending the latest incident if it ended less than INCIDENT_GAP_SECONDS ago."""
+    ts = _utc(timestamp)
+    with closing(_connect()) as conn, conn:
+        last = conn.execute("SELECT * FROM incidents ORDER BY start DESC LIMIT 1").fetchone()
+        gap = (datetime.fromisoformat(ts) - datetime.fromisoformat(last["end"])).total_seconds() if last else None
+        if last and 0 <= gap <= INCIDENT_GAP_SECONDS:
+            incident_id = last["id"]
+            best = police_score > last["max_score"]
+            conn.execute(
+                "UPDATE incidents SET end = ?, frames = frames + 1, max_score = ?, screenshot = ? WHERE id = ?",
+                (ts, max(police_score, last["max_score"]), screenshot if best else last["screenshot"], incident_id))
+        else:
+            incident_id = conn.execute(
+                "INSERT INTO incidents (start, end, frames, max_score, screenshot) VALUES (?, ?, 1, ?, ?)",
+                (ts, ts, police_score, screenshot)).lastrowid
+        conn.execute(
+            "INSERT OR REPLACE INTO sightings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (ts, screenshot, people_count, police_score, police_cars, police_vans, police_uniformed, incident_id))
+    return incident_id
+
+
+def replace_sightings(spans, rows):
+    """
+    Backfill: drop the sightings in each (start, stop) span (inclusive), add `rows`, and regroup
+    the incidents around them. rows: (timestamp, screenshot, people_count, police_score,
+    police_cars, police_vans, police_uniformed), in any order and at any age.
+    """
+    times = [_utc(t) for span in spans for t in span] + [_utc(row[0]) for row in rows]
+    if not times:
+        return
+    with closing(_connect()) as conn, conn:
+        for start, stop in spans:
+            conn.execute("DELETE FROM sightings WHERE timestamp >= ? AND timestamp <= ?", (_utc(start), _utc(stop)))
+        # incident_id 0 until _regroup assigns one
+        conn.executemany("INSERT OR REPLACE INTO sightings VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                         [(_utc(row[0]), *row[1:]) for row in rows])
+        gap = timedelta(seconds=INCIDENT_GAP_SECONDS)
+        _regroup(conn, (datetime.fromisoformat(min(times)) - gap).isoformat(),
+                 (datetime.fromisoformat(max(times)) + gap).isoformat())
+
+
+def _regroup(conn, lo, hi):
+    """Rebuild the incidents overlapping [lo, hi] (and any unassigned sightings) from their sightings."""
+    ids = [r[0] for r in conn.execute("SELECT id FROM incidents WHERE end >= ? AND start <= ?", (lo, hi))]
+    marks = ','.join('?' * len(ids))
+    rows = conn.execute(f"SELECT timestamp, screenshot, police_score FROM sightings "
+                        f"WHERE incident_id = 0 OR incident_id IN ({marks}) ORDER BY timestamp", ids).fetchall()
+    conn.execute(f"DELETE FROM incidents WHERE id IN ({marks})", ids)
+    incident = None
+    for ts, screenshot, score in rows:
+        if incident and (datetime.fromisoformat(ts) - datetime.fromisoformat(incident["end"])).total_seconds() \
+                <= INCIDENT_GAP_SECONDS:
+            incident["end"] = ts
+            incident["members"].append(ts)
+            if score > incident["max_score"]:
+                incident.update(max_score=score, screenshot=screenshot)
+        else:
+            _insert_incident(conn, incident)
+            incident = {"start": ts, "end": ts, "max_score": score, "screenshot": screenshot, "members": [ts]}
+    _insert_incident(conn, incident)
+
+
+def _insert_incident(conn, incident):
+    if not incident:
+        return
+    incident_id = conn.execute(
+        "INSERT INTO incidents (start, end, frames, max_score, screenshot) VALUES (?, ?, ?, ?, ?)",
+        (incident["start"], incident["end"], len(incident["members"]), incident["max_score"],
+         incident["screenshot"])).lastrowid
+    conn.executemany("UPDATE sightings SET incident_id = ? WHERE timestamp = ?",
+                     [(incident_id, ts) for ts in incident["members"]])
+
+
+def get_sightings(limit=100, cursor=None):
+    """Newest first. cursor: timestamp of the last item already seen. `total` only comes with the first page."""
+    with closing(_connect()) as conn, conn:
+        rows = conn.execute(
+            """SELECT s.*, i.start AS incident_start, i.frames AS incident_frames FROM sightings s
+               JOIN incidents i ON i.id = s.incident_id
+               WHERE s.timestamp < ? ORDER BY s.timestamp DESC LIMIT ?""",
+            (cursor or '9999', limit)).fetchall()
+        # A full scan, so only on the first page; later pages keep their constant cost
+        total = None if cursor else conn.execute("SELECT COUNT(*) FROM sightings").fetchone()[0]
+    items = [dict(r) for r in rows]
+    page = {"sightings": items, "next_cursor": items[-1]["timestamp"] if len(items) == limit else None}
+    if total is not None:
+        page["total"] = total
+    return page
+
+
+def get_incidents(limit=50, cursor=None):
+    """Newest first. cursor: start of the last incident already seen."""
+    with closing(_connect()) as conn, conn:
+        rows = conn.execute(
+            "SELECT * FROM incidents WHERE start < ? ORDER BY start DESC LIMIT ?",
+            (cursor or '9999', limit)).fetchall()
+    items = [dict(r) for r in rows]
+    return {"incidents": items, "next_cursor": items[-1]["start"] if len(items) == limit else None}
+
+
+def screenshots_between(start, stop):
+    """Frame names of sightings in [start, stop), for retention to keep."""
+    with closing(_connect()) as conn, conn:
+        rows = conn.execute("SELECT screenshot FROM sightings WHERE timestamp >= ? AND timestamp < ?",
+                            (_utc(start), _utc(stop))).fetchall()
+    return {r[0] for r in rows if r[0]}
+
+
+def is_empty():
+    with closing(_connect()) as conn, conn:
+        return conn.execute("SELECT 1 FROM sightings LIMIT 1").fetchone() is None
+
+
+def import_history(sightings, catalog):
+    """
+    One-time migration of sightings recorded before the index existed.
+    sightings: get_police_sightings() rows, matched to the newest frame at or before each one.
+    """
+    for s in sorted(sightings, key=lambda x: x['timestamp']):
+        screenshot = catalog.at_or_before(datetime.fromisoformat(s['timestamp']))
+        record_sighting(s['timestamp'], screenshot, s['people_count'],
+                        s['police_score'], s['police_cars'], s['police_vans'], s['police_uniformed'])
+    print(f"[sightings] Imported {len(sightings)} sightings", flush=True)
@@ -0,0 +1,110 @@
+"""
+Current party snapshot held in memory, persisted write-behind to party_data.json
+"""
+import os
+import json
+import hashlib
+import threading
+
+DEFAULT = {"people_count": 0, "party_level": 0, "car_count": 0, "police_count": 0,
+           "police_score": 0, "police_cars": 0, "police_vans": 0, "police_uniformed": 0,
+           "last_updated": None, "error": None}
+
+
+class PartyState:
+    """
+    Thread-safe snapshot with a version (bumped per change) and an ETag (hash of the JSON body,
+    so every worker process gives the same ETag for the same data). Reads return the shared dict
+    and its pre-encoded body, treat them as read-only. Updates are written to disk `delay` seconds
+    later, coalesced, through a temp file and rename so readers never see a partial file.
+    """
+
+    def __init__(self, path, default=DEFAULT, delay=1.0):
+        self.path = path
+        self.default = default
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self.version = 0
+        self.writes = 0
+        self._set(dict(default))
+
+    def _set(self, data):
+        body = json.dumps(data)
+        self._data = data
+        self._body = body
+        self._etag = hashlib.sha1(body.encode()).hexdigest()[:16]
+        self.version += 1
+
+    def load(self):
+        """Rehydrate from disk (startup, or after another process wrote it)."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"[ERROR] {self.path} unreadable, starting empty: {e}", flush=True)
+            return
+        with self._lock:
+            self._set(data)
+
+    def get(self):
+        with self._lock:
+            return self._data
+
+    def snapshot(self):
+        """(data, body, etag, version) of the same moment."""
+        with self._lock:
+            return self._data, self._body, self._etag, self.version
+
+    def update(self, changes):
+        """Merge `changes` into a new snapshot, schedule the write, return the new data."""
+        with self._lock:
+            self._set({**self._data, **changes})
+            self._schedule()
+            return self._data
+
+    def replace(self, data):
+        """
+        Adopt a snapshot another process already persisted (no write), unless ours is as new:
+        events arrive late, so our own or an older one must not roll the state back.
+        """
+        with self._lock:
+            current = self._data.get("last_updated")
+            if current is None or (data.get("last_updated") or '') > current:
+                self._set(data)
+
+    def _schedule(self):
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write the latest snapshot now if it changed since the last write."""
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                body = self._body
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    f.write(body)
+                os.replace(tmp, self.path)
+                self.writes += 1
+            except OSError as e:
+                print(f"[ERROR] writing {self.path}: {e}", flush=True)
+                with self._lock:
+                    self._schedule()
+
+    def stats(self):
+        with self._lock:
+            return {"version": self.version, "etag": self._etag, "writes": self.writes, "pending": self._dirty}
@@ -0,0 +1,60 @@
+"""
+Compressed copies of each frame (full size and thumbnail), stored under screenshots/variants/
+"""
+import os
+import threading
+from PIL import Image
+
+from config import VARIANT_FORMAT, VARIANT_QUALITY, THUMB_WIDTH
+
+# size: target width (None = keep)
+SIZES = {"full": None, "thumb": THUMB_WIDTH}
+MIMETYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+
+def variant_path(src, size):
+    """screenshots/frame_X.png -> screenshots/variants/frame_X_thumb.webp"""
+    stem = os.path.splitext(os.path.basename(src))[0]
+    return os.path.join(os.path.dirname(src), 'variants', f'{stem}_{size}.{VARIANT_FORMAT}')
+
+
+def encode_variant(src, size):
+    """Write one variant (atomically, concurrent requests may race). Returns its path."""
+    out = variant_path(src, size)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with Image.open(src) as img:
+        img = img.convert('RGB')
+        width = SIZES[size]
+        if width and img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        tmp = f'{out}.{threading.get_ident()}.tmp'
+        img.save(tmp, format=VARIANT_FORMAT.upper(), quality=VARIANT_QUALITY)
+    os.replace(tmp, out)
+    return out
+
+
+def make_variants(src):
+    """Capture stage: pre-encode every size. Failures only mean they get encoded on first request."""
+    for size in SIZES:
+        try:
+            encode_variant(src, size)
+        except Exception as e:
+            print(f"[ERROR] variant {size} of {src}: {e}", flush=True)
+
+
+def get_variant(src, size):
+    """Path and mimetype to serve for a frame. size is 'original' (the PNG) or one of SIZES."""
+    if size == 'original':
+        return src, MIMETYPES["png"]
+    path = variant_path(src, size)
+    if not os.path.exists(path):
+        path = encode_variant(src, size)
+    return path, MIMETYPES[VARIANT_FORMAT]
+
+
+def remove_variants(src):
+    for size in SIZES:
+        try:
+            os.remove(variant_path(src, size))
+        except FileNotFoundError:
+            pass
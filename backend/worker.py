@@ -0,0 +1,137 @@
+"""
+Long-lived analysis worker: jobs go through a queue, each with its own deadline
+"""
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class AnalysisJob:
+    def __init__(self, image_path, timeout):
+        self.id = uuid.uuid4().hex[:12]
+        self.image_path = image_path
+        self.status = 'queued'  # queued, running, done, failed, timed_out
+        self.result = None
+        self.error = None
+        self.submitted = time.monotonic()
+        self.deadline = self.submitted + timeout  # Queueing included
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "image_path": self.image_path,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class AnalyzerWorker:
+    """
+    Runs analyze_fn(image_path, deadline=...) on worker threads that stay up between frames,
+    so per-process state (local detector model, result cache) stays warm. analyze_fn gets the
+    job's time.monotonic() deadline and must stop by then; jobs that expire while queued are skipped.
+    """
+
+    def __init__(self, analyze_fn, workers=1, timeout=300, name='analyzer'):
+        self.analyze_fn = analyze_fn
+        self.workers = workers
+        self.timeout = timeout
+        self.name = name
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._running = 0
+        self._latencies = deque(maxlen=50)
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    def start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._run, name=f'{self.name}-{len(self._threads)}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def submit(self, image_path, timeout=None):
+        self.start()
+        job = AnalysisJob(image_path, timeout or self.timeout)
+        self._queue.put(job)
+        return job
+
+    def analyze(self, image_path, timeout=None):
+        """Submit and wait. Returns the analysis dict or raises on failure/timeout."""
+        timeout = timeout or self.timeout
+        job = self.submit(image_path, timeout)
+        if not job.wait(timeout):
+            with self._lock:
+                job.status = 'timed_out'
+                self.timed_out += 1
+            raise TimeoutError(f"analysis of {image_path} exceeded {timeout}s")
+        if job.status == 'failed':
+            raise RuntimeError(job.error)
+        return job.result
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            if job.status == 'timed_out' or time.monotonic() >= job.deadline:
+                continue  # Caller gave up (or is about to) while it was queued
+            job.status = 'running'
+            job.started = time.monotonic()
+            with self._lock:
+                self._running += 1
+            try:
+                job.result = self.analyze_fn(job.image_path, deadline=job.deadline)
+                status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                status = 'failed'
+            job.finished = time.monotonic()
+            with self._lock:
+                self._running -= 1
+                self._latencies.append(job.finished - job.started)
+                if status == 'failed':
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                # A timed-out caller has already moved on; keep its status
+                if job.status != 'timed_out':
+                    job.status = status
+            job._done.set()
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "running": self._running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+                "last_latency_s": round(latencies[-1], 2) if latencies else None,
+                "avg_latency_s": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            }
+
+
+def stub_analyze(image_path, deadline=None):
+    """Fixed counts without calling any model, for tests and dry runs."""
+    return {"people": 3, "street": 2, "terrace": 1, "cars": 1,
+            "police_cars": 0, "police_vans": 0, "police_uniformed": 0}